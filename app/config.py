@@ -9,4 +9,35 @@ SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")
 SHEET_NAME = os.getenv("SHEET_NAME", "HungryLogs_Data")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
-TELEGRAM_CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID", "0"))
\ No newline at end of file
+TELEGRAM_CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID", "0"))
+# Хранилище: "csv" (data/*.csv), "sharded" (по файлу приёмов на пользователя) или "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/hungrylogs.sqlite3")
+MEAL_SHARDS_DIR = os.getenv("MEAL_SHARDS_DIR", "data/meals")
+# Фоновая репликация локального хранилища в Google Sheets ("1" — включена)
+GSHEET_REPLICATION = os.getenv("GSHEET_REPLICATION", "0") == "1"
+# OpenAI: максимум одновременных запросов к модели и таймаут запроса (секунды)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Эмбеддинги индекса похожих приёмов: "hashing" (офлайн) или "openai"
+MEAL_INDEX_EMBEDDER = os.getenv("MEAL_INDEX_EMBEDDER", "hashing")
+# Микропакеты разбора приёмов: окно сбора (мс, 0 — выключено) и максимум текстов в пакете
+MEAL_BATCH_WINDOW_MS = int(os.getenv("MEAL_BATCH_WINDOW_MS", "0"))
+MEAL_BATCH_MAX = int(os.getenv("MEAL_BATCH_MAX", "8"))
+# Устойчивость к сбоям модели: повторы, таймаут попытки и общий срок (секунды), хеджирование ("1" — включено)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "20"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "40"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+# Режим получения апдейтов: "polling" или "webhook" (aiohttp-сервер, в контейнере — порт 80)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "80"))
+# Хранилище состояний диалогов (FSM): "sqlite" (переживает перезапуск, с TTL) или "memory"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", "data/fsm.sqlite3")
+# Через сколько часов без активности брошенный диалог удаляется
+FSM_TTL_HOURS = float(os.getenv("FSM_TTL_HOURS", "24"))
@@ -1,12 +1,19 @@
+import asyncio
+from datetime import date, timedelta
+
 from aiogram import Router, F, types
 from aiogram.exceptions import TelegramForbiddenError
 
 from app.config import ADMIN_ID
-from app.services.csv_client import CSVClient
+from app.services.analytics import ColumnarMealStore, targets_hit_share
+from app.services.llm_metrics import llm_metrics
+from app.services.meal_cache import get_meal_cache
+from app.services.storage import get_async_storage
 from app.services.logger import log_event
+from app.services.openai_client import inflight, breaker
 
 router = Router()
-csv_client = CSVClient()
+storage = get_async_storage()
 
 @router.message(F.text.startswith("/broadcast"))
 async def broadcast_message(message: types.Message):
@@ -25,7 +32,7 @@ async def broadcast_message(message: types.Message):
     await message.answer("🚀 Начинаю рассылку...")
 
     # Получаем всех пользователей из CSV
-    user_ids = csv_client.get_all_user_ids()
+    user_ids = await storage.get_all_user_ids()
     sent = 0
     failed = 0
 
@@ -42,3 +49,89 @@ async def broadcast_message(message: types.Message):
             log_event("broadcast_error", {"user_id": user_id, "error": str(e)})
 
     await message.answer(f"✅ Рассылка завершена.\n\n📬 Отправлено: {sent}\n🚫 Не доставлено: {failed}")
+
+
+@router.message(F.text.startswith("/analytics"))
+async def analytics_report(message: types.Message):
+    """Сводка по всей базе за последние 4 недели (колоночный движок)"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    def build_report():
+        today = date.today()
+        start = (today - timedelta(days=27)).isoformat()
+        store = ColumnarMealStore.from_storage(storage.sync).between(start, today.isoformat())
+        summary = store.cohort_summary()
+        _, _, weekly, _ = store.weekly_averages()
+        hit_share = targets_hit_share(store, storage.sync.get_users())
+        return summary, weekly, hit_share
+
+    summary, weekly, hit_share = await asyncio.to_thread(build_report)
+    if not summary["users"]:
+        await message.answer("📭 За последние 4 недели записей нет.")
+        return
+
+    avg = summary["avg"]
+    await message.answer(
+        "📊 Аналитика за 4 недели\n\n"
+        f"👥 Активных пользователей: {summary['users']}\n"
+        f"📅 Дней с записями: {summary['user_days']}\n"
+        f"🍽 Приёмов пищи: {summary['meals']}\n\n"
+        f"Средний день: {avg['calories']:.0f} ккал, Б {avg['protein']:.0f} / Ж {avg['fat']:.0f} / У {avg['carbs']:.0f}\n"
+        f"Медиана дня: {summary['calories_median']:.0f} ккал, 90-й перцентиль: {summary['calories_p90']:.0f} ккал\n"
+        f"Медиана средних по пользователям: {summary['user_avg_calories_median']:.0f} ккал\n"
+        f"Среднее недельных средних: {weekly[:, 0].mean():.0f} ккал\n\n"
+        f"🎯 В пределах ±10% от цели: {hit_share * 100:.0f}% пользователей"
+    )
+
+
+@router.message(F.text.startswith("/cache_stats"))
+async def cache_stats(message: types.Message):
+    """Эффективность кэша разбора приёмов пищи"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    stats = get_meal_cache().stats()
+    await message.answer(
+        "🗄 Кэш разбора приёмов пищи\n\n"
+        f"⚡ Попаданий в памяти: {stats['memory_hits']}\n"
+        f"💾 Попаданий на диске: {stats['disk_hits']}\n"
+        f"🤖 Промахов (запросов к модели): {stats['misses']}\n"
+        f"📈 Доля попаданий: {stats['hit_rate'] * 100:.1f}%\n\n"
+        f"Записей: {stats['memory_entries']} в памяти, {stats['disk_entries']} на диске\n"
+        f"⏱ Средний запрос к модели: {stats['avg_llm_seconds']:.1f} с, сэкономлено ≈ {stats['saved_llm_seconds']:.0f} с"
+    )
+
+
+@router.message(F.text.startswith("/llm_stats"))
+async def llm_stats(message: types.Message):
+    """Телеметрия запросов к модели: время, токены, ошибки, ответы без модели"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    snapshot = llm_metrics.snapshot()
+    if not snapshot["functions"]:
+        await message.answer("📭 Запросов к модели ещё не было.")
+        return
+
+    lines = [f"🤖 Запросы к модели за {snapshot['uptime_s'] // 60} мин\n"]
+    for name, stats in sorted(snapshot["functions"].items()):
+        wall, ttfb = stats["wall_ms"], stats["ttfb_ms"]
+        outcomes = ", ".join(f"{k}: {v}" for k, v in sorted(stats["outcomes"].items())) or "—"
+        hits = ", ".join(f"{k}: {v}" for k, v in sorted(stats["cache_hits"].items())) or "—"
+        events = ", ".join(f"{k}: {v}" for k, v in sorted(stats["events"].items())) or "—"
+        lines.append(
+            f"<b>{name}</b>\n"
+            f"Вызовов: {stats['calls']} ({outcomes}), ошибок {stats['error_rate'] * 100:.1f}%\n"
+            f"⏱ p50 ≤ {wall['p50']:.0f} мс, p95 ≤ {wall['p95']:.0f} мс, max {wall['max']:.0f} мс\n"
+            f"📡 До первого байта: p50 ≤ {ttfb['p50']:.0f} мс, p95 ≤ {ttfb['p95']:.0f} мс\n"
+            f"🔤 Токены: {stats['prompt_tokens']} промпт / {stats['completion_tokens']} ответ\n"
+            f"⚡ Без модели: {hits}\n"
+            f"🔄 Повторы/хеджи/отказы: {events}\n"
+        )
+    lines.append(f"🛡 Автомат: {breaker.state}")
+    lines.append(f"🔁 Схлопнуто одинаковых запросов: {inflight.counters['coalesced']} из {inflight.counters['calls']}")
+    await message.answer("\n".join(lines), parse_mode="HTML")
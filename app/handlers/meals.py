@@ -3,13 +3,13 @@ from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 import re
 
-from app.services.csv_client import CSVClient
+from app.handlers.statistics import STATS_BUTTONS
+from app.services.storage import get_async_storage
 from app.services.openai_client import parse_meal_text
 from app.services.logger import logger, log_event, log_model_interaction
-# from app.services.rag_client import parse_meal_text_rag
 
 router = Router()
-csv_client = CSVClient()
+storage = get_async_storage()
 
 
 # >>> функция экранирования MarkdownV2
@@ -22,14 +22,14 @@ def escape_md_v2(text: str) -> str:
     return re.sub(r'([\\\[\]\(\)~`>#+\-=|{}.!])', r'\\\1', text)
 
 
-@router.message(StateFilter(None), F.text & ~F.text.startswith("/") & ~F.text.in_({"За день","За неделю","За 4 недели"}))
+@router.message(StateFilter(None), F.text & ~F.text.startswith("/") & ~F.text.in_(STATS_BUTTONS))
 async def add_meal_handler(message: types.Message, state: FSMContext):
     # Если пользователь находится в процессе регистрации — не обрабатываем сообщение
     if await state.get_state() is not None:
         return
 
     user_id = message.from_user.id
-    if not csv_client.user_exists(user_id):
+    if not await storage.user_exists(user_id):
         await message.answer("Сначала нужно зарегистрироваться. Напиши /start")
         logger.info(f"🚫 Пользователь {user_id} попытался добавить meal без регистрации")
         return
@@ -41,12 +41,14 @@ async def add_meal_handler(message: types.Message, state: FSMContext):
     thinking_message = await message.answer("🤖 Разбираю приём пищи, ищу калории и БЖУ...")
 
     parsed = await parse_meal_text(meal_text, user_id)
-    # parsed_rag = await parse_meal_text_rag(meal_text, user_id)
 
     if parsed.get("clarification"):
         logger.info(f"⚠️ parse_meal_text вернул clarification для user {user_id}: '{meal_text}'")
         log_event("meal_parsed_with_clarification", user_id, extra_info=str(parsed.get("clarification")))
         await state.update_data(pending_meal="")
+        # ничего не записываем: без разбора (в т.ч. пока модель недоступна) сохранился бы приём на 0 ккал
+        await thinking_message.edit_text(f"⚠️ {parsed['clarification']}")
+        return
 
     else:
         await state.update_data(pending_meal="")
@@ -87,7 +89,7 @@ async def add_meal_handler(message: types.Message, state: FSMContext):
         logger.exception(f"[log_model_interaction] failed for user {user_id}: {e}")
 
     # Сохраняем приём пищи
-    csv_client.add_meal([
+    await storage.add_meal([
         user_id,
         parsed.get("date"),
         meal_text,
@@ -99,8 +101,8 @@ async def add_meal_handler(message: types.Message, state: FSMContext):
     logger.info(f"✅ Пользователь {user_id} добавил приём пищи: {meal_text}")
     log_event("meal_added", user_id)
 
-    total = csv_client.get_daily_totals(user_id, parsed.get("date"))
-    user_profile = csv_client.get_user(user_id)
+    total = await storage.get_daily_totals(user_id, parsed.get("date"))
+    user_profile = await storage.get_user(user_id)
 
 
     text = (
@@ -112,5 +114,7 @@ async def add_meal_handler(message: types.Message, state: FSMContext):
             f"Жиры: *{int(total['fat'])}* / {user_profile['f_goal']}\n"
             f"Углеводы: *{int(total['carbs'])}* / {user_profile['c_goal']}"
         )
+    if parsed.get("estimated"):
+        text += "\n\n⚠️ Сервис подсчёта сейчас недоступен — это приблизительная оценка."
     safe_text = escape_md_v2(text)
     await thinking_message.edit_text(safe_text, parse_mode="MarkdownV2")
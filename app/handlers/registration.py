@@ -1,15 +1,21 @@
+import asyncio
+
 from aiogram import Router, types, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 
-from app.services.csv_client import CSVClient
+from app.services.storage import get_async_storage
 from app.services.logger import logger, log_event
 from app.services.openai_client import ai_assistant_feedback
 from app.services.openai_client import get_user_goal
+from app.services.nutrition_utils import (
+    QUESTION_FIELDS, REQUIRED_FIELDS, build_profile, fields_from_answer, normalize_fields, profile_fields_from_answers,
+)
 
 router = Router()
-csv_client = CSVClient()
+storage = get_async_storage()
 
 
 # --- Состояния ---
@@ -37,13 +43,12 @@ questions = [
 
 
 # --- Вспомогательные функции ---
-def user_exists(user_id: int) -> bool:
-    users = csv_client.get_users()
-    return any(int(u["user_id"]) == user_id for u in users)
+async def user_exists(user_id: int) -> bool:
+    return await storage.user_exists(user_id)
 
 
-def add_user_profile(user_id: int, profile: dict):
-    csv_client.add_user([
+async def add_user_profile(user_id: int, profile: dict):
+    await storage.add_user([
         user_id,
         profile.get("age", ""),
         profile.get("sex", ""),
@@ -59,15 +64,92 @@ def add_user_profile(user_id: int, profile: dict):
     logger.info(f"👤 [add_user_profile] User {user_id} profile added: {profile}")
     log_event("registration_saved", user_id, extra_info=str(profile.get('goal', '')))
 
-def parse_user_profile(answers_text: str) -> dict:
-    return get_user_goal(answers_text)
+# Сколько раз переспрашивать неразобранный ответ, прежде чем сдаться
+REASK_LIMIT = 2
+
+# Фоновые запросы к модели по отдельным ответам: (user_id, номер вопроса) -> задача
+_extractions: dict[tuple[int, int], asyncio.Task] = {}
+
+
+def _qa_text(index: int, answer: str) -> str:
+    return f"{index+1}. {questions[index]}\n{answer}"
+
+
+async def extract_answer(state: FSMContext, user_id: int, index: int, answer: str):
+    """
+    Разбор ответа сразу по приходу: локально, а то, что не распозналось, — фоном у модели.
+    Результат хранится в FSM (fields_<номер>) вместе с текстом ответа, по которому получен.
+    """
+    data = await state.get_data()
+    weight = (data.get("fields_2") or {}).get("fields", {}).get("weight")
+    fields = fields_from_answer(index, answer, weight)
+    await state.update_data({f"fields_{index}": {"text": answer, "fields": fields}})
+
+    previous = _extractions.pop((user_id, index), None)
+    if previous is not None:
+        previous.cancel()
+    if any(fields.get(k) is None for k in REQUIRED_FIELDS if k in fields):
+        task = asyncio.create_task(_extract_with_model(state, user_id, index, answer))
+        _extractions[(user_id, index)] = task
+
+
+async def _extract_with_model(state: FSMContext, user_id: int, index: int, answer: str):
+    try:
+        found = normalize_fields(await get_user_goal(_qa_text(index, answer)))
+        data = await state.get_data()
+        cached = data.get(f"fields_{index}")
+        # ответ могли отредактировать, пока шёл запрос, — тогда результат уже не нужен
+        if cached is None or cached["text"] != answer:
+            return
+        fields = {k: cached["fields"].get(k) if cached["fields"].get(k) is not None else found.get(k)
+                  for k in QUESTION_FIELDS[index]}
+        await state.update_data({f"fields_{index}": {"text": answer, "fields": fields}})
+    except Exception as e:
+        logger.error(f"❌ [extract_answer] Ошибка разбора ответа {index + 1} user_id={user_id}: {e}")
+    finally:
+        if _extractions.get((user_id, index)) is asyncio.current_task():
+            del _extractions[(user_id, index)]
+
+
+def _forget_extractions(user_id: int):
+    for key in [k for k in _extractions if k[0] == user_id]:
+        _extractions.pop(key).cancel()
+
+
+async def parse_user_profile(answers: list[str], cached: dict = None) -> tuple[dict, list[str]]:
+    """
+    Профиль по формуле Mifflin–St Jeor. Поля анкеты разбираются локально; нераспознанные
+    берутся из уже готовых фоновых результатов (cached — данные FSM), и только если
+    их нет — одним запросом к модели по всем ответам.
+    Возвращает (профиль, []) или ({}, поля, которые так и не удалось разобрать).
+    """
+    fields, missing = profile_fields_from_answers(answers)
+    for key in list(missing):
+        for index, keys in enumerate(QUESTION_FIELDS):
+            entry = (cached or {}).get(f"fields_{index}")
+            if key in keys and entry and index < len(answers) and entry["text"] == answers[index]:
+                fields[key] = entry["fields"].get(key)
+        if fields[key] is not None:
+            missing.remove(key)
+    if missing:
+        logger.info(f"🧩 [parse_user_profile] Не разобраны поля {missing}, спрашиваем модель")
+        answers_text = "\n".join(
+            [f"{i+1}. {q}\n{a}" for i, (q, a) in enumerate(zip(questions, answers))]
+        )
+        extracted = normalize_fields(await get_user_goal(answers_text))
+        for key in missing:
+            fields[key] = extracted[key]
+        missing = [key for key in missing if fields[key] is None]
+        if missing:
+            return {}, missing
+    return build_profile(fields), []
 
 
 # --- Старт регистрации ---
 @router.message(F.text == "/start")
 async def start_registration(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    if user_exists(user_id):
+    if await user_exists(user_id):
         await message.answer(
             "Ты уже зарегистрирован 🙂\n"
             "Отправь запись о приёме пищи.\n\n"
@@ -77,8 +159,9 @@ async def start_registration(message: types.Message, state: FSMContext):
         await state.clear()
         return
 
+    _forget_extractions(user_id)
     await state.set_state(Registration.collecting)
-    await state.update_data(answers=[], current=0)
+    await state.set_data({"answers": [], "current": 0, "answer_ids": []})
     await message.answer("Привет! Давай познакомимся, чтобы я понял твои цели 💬")
     await message.answer(questions[0])
     print(await state.get_state())
@@ -86,24 +169,50 @@ async def start_registration(message: types.Message, state: FSMContext):
 # --- Сбор ответов на вопросы ---
 @router.message(Registration.collecting)
 async def collect_answers(message: types.Message, state: FSMContext):
+    user_id = message.from_user.id
     data = await state.get_data()
     answers = data.get("answers", [])
+    answer_ids = data.get("answer_ids", [])
     current = data.get("current", 0)
+    reask = data.get("reask")
 
-    answers.append(message.text)
-    current += 1
-    await state.update_data(answers=answers, current=current)
+    if not message.text:
+        # стикер, фото, голосовое — ответа нет, повторяем вопрос
+        await message.answer(f"Ответь, пожалуйста, текстом 🙂\n{questions[current if reask is None else reask]}")
+        return
+
+    if reask is None:
+        answers.append(message.text)
+        answer_ids.append(message.message_id)
+        current += 1
+        index = current - 1
+    else:
+        # уточнение ответа, который не удалось разобрать
+        index = reask
+        answers[index] = message.text
+        answer_ids[index] = message.message_id
+    await state.update_data(answers=answers, answer_ids=answer_ids, current=current, reask=None)
+    # разбор ответа начинается сразу, пока пользователь отвечает на следующие вопросы
+    await extract_answer(state, user_id, index, message.text)
 
     if current < len(questions):
         await message.answer(questions[current])
         return
 
-    # все ответы получены
+    # все ответы получены: дожидаемся фоновых разборов (обычно уже готовы) и считаем норму
     await message.answer("Спасибо! Обрабатываю твои ответы 🤖...")
-    answers_text = "\n".join(
-        [f"{i+1}. {q}\n{a}" for i, (q, a) in enumerate(zip(questions, answers))]
-    )
-    profile = parse_user_profile(answers_text)
+    pending = [task for key, task in _extractions.items() if key[0] == user_id]
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    data = await state.get_data()
+    profile, missing = await parse_user_profile(answers, data)
+    if not profile and data.get("reasks", 0) < REASK_LIMIT:
+        # не угадываем: переспрашиваем первый вопрос с неразобранным полем
+        index = next(i for i, keys in enumerate(QUESTION_FIELDS) if set(keys) & set(missing))
+        await state.update_data(reask=index, reasks=data.get("reasks", 0) + 1)
+        await message.answer(f"Не получилось разобрать ответ 🤔 Уточни, пожалуйста:\n{questions[index]}")
+        log_event("registration_reask", user_id, extra_info=",".join(missing))
+        return
     if not profile:
         await message.answer("Не удалось сформировать профиль 😔 Попробуй ещё раз позже.")
         await state.clear()
@@ -130,6 +239,21 @@ async def collect_answers(message: types.Message, state: FSMContext):
     )
 
 
+# --- Исправленный ответ: сбрасываем его разбор и разбираем заново ---
+@router.edited_message(Registration.collecting)
+async def edit_answer(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    answer_ids = data.get("answer_ids", [])
+    if message.message_id not in answer_ids:
+        return
+    index = answer_ids.index(message.message_id)
+    answers = data.get("answers", [])
+    answers[index] = message.text or ""
+    await state.update_data(answers=answers)
+    await extract_answer(state, message.from_user.id, index, message.text or "")
+    logger.info(f"✏️ [edit_answer] User {message.from_user.id} исправил ответ {index + 1}")
+
+
 # --- Callback для сохранения или редактирования ---
 @router.callback_query(F.data == "confirm_goal")
 async def confirm_goal_callback(callback: types.CallbackQuery, state: FSMContext):
@@ -139,7 +263,7 @@ async def confirm_goal_callback(callback: types.CallbackQuery, state: FSMContext
 
     await callback.answer()
     if profile:
-        add_user_profile(user_id, profile)
+        await add_user_profile(user_id, profile)
         await callback.message.edit_text(
             f"✅ Профиль сохранён!\n\n"
             f"Цель: {profile['goal']}\n"
@@ -171,7 +295,7 @@ async def edit_goal_callback(callback: types.CallbackQuery, state: FSMContext):
 @router.message(F.text == "/update_goal")
 async def update_goal(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    user = csv_client.get_user(user_id)
+    user = await storage.get_user(user_id)
     if not user:
         await message.answer("Сначала нужно зарегистрироваться. Напиши /start")
         return
@@ -310,6 +434,59 @@ async def manual_goal_input(message: types.Message, state: FSMContext):
     log_event("goal_manual_suggested", user_id, extra_info=str(new_goal))
 
 
+class LiveMessage:
+    """
+    Сообщение бота, которое дописывается по мере ответа модели.
+    edit_text не чаще interval секунд (лимиты Telegram на редактирование);
+    промежуточные обновления схлопываются — показывается самый свежий текст.
+    """
+
+    def __init__(self, message: types.Message, prefix: str = "🤖 ", interval: float = 1.5):
+        self.message = message
+        self.prefix = prefix
+        self.interval = interval
+        self._text = ""
+        self._shown = ""
+        self._next_at = 0.0
+        self._task = None
+
+    def update(self, text: str):
+        self._text = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._edit_loop())
+
+    async def _edit_loop(self):
+        loop = asyncio.get_running_loop()
+        while self._text != self._shown:
+            delay = self._next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = self._text
+            try:
+                await self.message.edit_text(f"{self.prefix}{text} ▌")
+                self._next_at = loop.time() + self.interval
+            except TelegramRetryAfter as e:
+                self._next_at = loop.time() + e.retry_after
+                continue
+            except TelegramBadRequest:
+                self._next_at = loop.time() + self.interval
+            self._shown = text
+
+    async def finish(self, text: str, **kwargs):
+        """Финальный текст (с кнопками); промежуточные правки больше не нужны."""
+        if self._task is not None:
+            self._task.cancel()
+        try:
+            try:
+                await self.message.edit_text(text, **kwargs)
+            except TelegramRetryAfter as e:
+                # лимит на редактирование: ждём и пробуем ещё раз, иначе итог не увидят
+                await asyncio.sleep(e.retry_after)
+                await self.message.edit_text(text, **kwargs)
+        except (TelegramBadRequest, TelegramRetryAfter):
+            await self.message.answer(text, **kwargs)
+
+
 # --- AI: отправляем запрос ИИ, сохраняем результат в state и присылаем подтверждение ---
 @router.message(UpdateGoal.ai_request)
 async def handle_ai_request(message: types.Message, state: FSMContext):
@@ -323,19 +500,19 @@ async def handle_ai_request(message: types.Message, state: FSMContext):
         log_event("goal_update_cancel_ai", user_id)
         return
 
-    # Сообщение-индекатор (не хранить это в state)
-    await message.answer("🤖 Анализирую твой рацион и цели...")
+    # Сообщение-индекатор (не хранить это в state): в него потоком пишется объяснение ИИ
+    live = LiveMessage(await message.answer("🤖 Анализирую твой рацион и цели..."))
 
-    result = await ai_assistant_feedback(user_id, user_request)
+    result = await ai_assistant_feedback(user_id, user_request, on_summary=live.update)
     if "error" in result:
-        await message.answer(result["error"])
+        await live.finish(result["error"])
         await state.clear()
         return
 
     summary = result.get("summary", "")
     g = result.get("new_goal")
     if not g:
-        await message.answer("⚠️ ИИ вернул некорректный формат. Попробуй позже.")
+        await live.finish("⚠️ ИИ вернул некорректный формат. Попробуй позже.")
         await state.clear()
         return
 
@@ -365,7 +542,7 @@ async def handle_ai_request(message: types.Message, state: FSMContext):
          InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_goal")]
     ])
 
-    await message.answer(
+    await live.finish(
         f"🤖 {summary}\n\n"
         f"📊 Новая цель (предложение AI):\n"
         f"🎯 {g_normalized['goal'].capitalize()}\n"
@@ -400,7 +577,7 @@ async def accept_goal_callback(callback: types.CallbackQuery, state: FSMContext)
 
     # Сохраняем в CSV (оборачиваем в try, логируем)
     try:
-        csv_client.update_user_target(user_id, g)
+        await storage.update_user_target(user_id, g)
         await callback.message.answer("✅ Новая цель сохранена!")
         logger.info(f"🎯 [accept_goal] Updated goal for {user_id}: {g}")
         log_event("goal_updated", user_id, extra_info=str(g))
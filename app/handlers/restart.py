@@ -2,20 +2,19 @@ from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from app.services.csv_client import CSVClient
+from app.services.storage import get_async_storage
 from app.services.logger import log_event
 
 router = Router()
-csv_client = CSVClient()
+storage = get_async_storage()
 
 # --- Перезапуск профиля ---
 @router.message(F.text == "/restart")
 async def restart_profile(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    users = csv_client.get_users()
 
     # Проверим, есть ли пользователь
-    if not any(int(u["user_id"]) == user_id for u in users):
+    if not await storage.user_exists(user_id):
         await message.answer("Ты ещё не зарегистрирован 🙂 Напиши /start, чтобы начать.")
         return
 
@@ -35,15 +34,8 @@ async def restart_profile(message: types.Message, state: FSMContext):
 @router.callback_query(F.data == "confirm_restart")
 async def confirm_restart(callback: types.CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
-    # --- Удаляем пользователя ---
-    users = csv_client.get_users()  # читаем всех
-    new_users = [u for u in users if int(u["user_id"]) != user_id]  # исключаем текущего
-    csv_client.save_users(new_users)  # сохраняем обратно
-
-    # --- Удаляем все записи о приёмах пищи ---
-    meals = csv_client.get_meals()
-    new_meals = [m for m in meals if int(m.get("user_id", 0)) != user_id]  # оставляем только других пользователей
-    csv_client.save_meals(new_meals)  # сохраняем обратно
+    # --- Удаляем пользователя и все записи о приёмах пищи ---
+    await storage.delete_user(user_id)
 
     # --- Сообщение пользователю ---
     await callback.message.edit_text(
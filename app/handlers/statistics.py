@@ -1,14 +1,28 @@
 from aiogram import Router, F, types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+import re
 from datetime import date, timedelta
 
 from aiogram.types import ReplyKeyboardRemove
 
-from app.services.csv_client import CSVClient
+from app.services.storage import get_async_storage
 from app.services.user_data import get_4weeks_stats
 from app.services.logger import log_event
 
 router = Router()
-csv_client = CSVClient()
+storage = get_async_storage()
+
+# Кнопки меню статистики (meals.py не принимает их за приём пищи)
+STATS_PERIODS = {"За день", "За неделю", "За 4 недели"}
+RANGE_PERIODS = {"За месяц": 30, "За год": 365}
+CUSTOM_PERIOD = "Свой период"
+STATS_BUTTONS = STATS_PERIODS | set(RANGE_PERIODS) | {CUSTOM_PERIOD}
+
+
+class StatsRange(StatesGroup):
+    waiting_range = State()
+
 
 # --- Helpers ---
 def safe_int(value, default=0):
@@ -28,6 +42,56 @@ def format_day_stats(user, day_total, day_date=None):
         f"БЖУ: {safe_int(day_total['protein'])}/{safe_int(day_total['fat'])}/{safe_int(day_total['carbs'])}\n"
     )
 
+def average_per_day(range_total):
+    """Среднее за день по дням с записями (из результата get_range_totals)."""
+    days = range_total.get("days", 0)
+    if not days:
+        return None
+    return {k: range_total[k] / days for k in ["calories", "protein", "fat", "carbs"]}
+
+def parse_date_range(text, today):
+    """
+    Разбирает период вида "01.09.2025 - 30.09.2025" или "01.09 - 30.09" (текущий год).
+    Возвращает (start, end) или None.
+    """
+    parts = [p.strip() for p in text.replace("—", "-").split("-")]
+    if len(parts) != 2:
+        return None
+    dates = []
+    for part in parts:
+        match = re.fullmatch(r"(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?", part)
+        if match is None:
+            return None
+        day, month, year = match.groups()
+        # год собираем сам: strptime без года берёт 1900-й, и "29.02" не разбирается даже в високосный год
+        year = today.year if year is None else int(year) + (2000 if len(year) == 2 else 0)
+        try:
+            dates.append(date(year, int(month), int(day)))
+        except ValueError:
+            return None
+    start, end = dates
+    if start > end:
+        start, end = end, start
+    return start, end
+
+async def format_range_stats(user, start, end):
+    range_total = await storage.get_range_totals(int(user["user_id"]), start.isoformat(), end.isoformat())
+    avg = average_per_day(range_total)
+    header = f"📅 Период {start.strftime('%d.%m.%Y')} — {end.strftime('%d.%m.%Y')}:\n"
+    if avg is None:
+        return header + "\n⚠️ Нет событий за выбранный период."
+    return (
+        header +
+        f"Дней с записями: {range_total['days']} из {(end - start).days + 1}\n\n"
+        f"📊 Среднее за день:\n"
+        f"Калории: {int(avg['calories'])} / {user.get('target_cal')}\n"
+        f"Белки: {int(avg['protein'])} / {user.get('p_goal')}\n"
+        f"Жиры: {int(avg['fat'])} / {user.get('f_goal')}\n"
+        f"Углеводы: {int(avg['carbs'])} / {user.get('c_goal')}\n\n"
+        f"Всего: {safe_int(range_total['calories'])} ккал, "
+        f"{safe_int(range_total['protein'])}/{safe_int(range_total['fat'])}/{safe_int(range_total['carbs'])} БЖУ"
+    )
+
 # --- /stats menu ---
 @router.message(F.text == "/statistics")
 async def stats_menu(message: types.Message):
@@ -35,7 +99,10 @@ async def stats_menu(message: types.Message):
         keyboard=[
             [types.KeyboardButton(text="За день"),
              types.KeyboardButton(text="За неделю"),
-             types.KeyboardButton(text="За 4 недели")]
+             types.KeyboardButton(text="За 4 недели")],
+            [types.KeyboardButton(text="За месяц"),
+             types.KeyboardButton(text="За год"),
+             types.KeyboardButton(text=CUSTOM_PERIOD)]
         ],
         resize_keyboard=True,
         one_time_keyboard=True
@@ -43,10 +110,10 @@ async def stats_menu(message: types.Message):
     await message.answer("Выбери период статистики:", reply_markup=keyboard)
 
 # --- show stats ---
-@router.message(F.text.in_({"За день", "За неделю", "За 4 недели"}))
+@router.message(F.text.in_(STATS_PERIODS))
 async def show_stats(message: types.Message):
     user_id = message.from_user.id
-    user = csv_client.get_user(user_id)
+    user = await storage.get_user(user_id)
     if not user:
         await message.answer("Сначала нужно зарегистрироваться. Напиши /start", reply_markup=ReplyKeyboardRemove())
         return
@@ -55,19 +122,17 @@ async def show_stats(message: types.Message):
 
     today = date.today()
     period = message.text
-    meals = [m for m in csv_client.get_meals() if int(m.get("user_id", 0)) == user_id]
 
     if period == "За день":
-        day_total = csv_client.get_daily_totals(user_id, today.isoformat())
+        day_total = await storage.get_daily_totals(user_id, today.isoformat())
         if not has_nonzero_values(day_total, ["calories", "protein", "fat", "carbs"]):
             await message.answer("⚠️ Нет событий за сегодня.")
             return
 
         text = f"📅 Приёмы пищи за сегодня:\n"
-        for m in meals:
-            if m.get("date") == today.isoformat():
-                text += f"- {m.get('meal_text','—')}: {safe_int(m.get('calories'))} ккал, " \
-                        f"{safe_int(m.get('protein'))}/{safe_int(m.get('fat'))}/{safe_int(m.get('carbs'))} БЖУ\n"
+        for m in await storage.get_meals_for_day(user_id, today.isoformat()):
+            text += f"- {m.get('meal_text','—')}: {safe_int(m.get('calories'))} ккал, " \
+                    f"{safe_int(m.get('protein'))}/{safe_int(m.get('fat'))}/{safe_int(m.get('carbs'))} БЖУ\n"
 
         text += (
             f"\n📊 Итого за день:\n"
@@ -86,7 +151,7 @@ async def show_stats(message: types.Message):
 
         for i in range(1, 8):  # вчера и 6 предыдущих дней
             day = today - timedelta(days=i)
-            day_total = csv_client.get_daily_totals(user_id, day.isoformat())
+            day_total = await storage.get_daily_totals(user_id, day.isoformat())
             totals_list.append(day_total)
             text += format_day_stats(user, day_total, day)
 
@@ -109,13 +174,13 @@ async def show_stats(message: types.Message):
         return
 
     if period == "За 4 недели":
-        stats = get_4weeks_stats(user_id)
+        stats = await get_4weeks_stats(user_id)
         if not stats["days"]:
             await message.answer("⚠️ Нет событий за последние 4 недели.")
             return
 
         weeks = []
-        # соберём по неделям, но используем get_daily_totals (агрегация внутри CSVClient)
+        # соберём по неделям: одна выборка из индекса периодов на неделю
         today = date.today()
         week_ranges = []
         for w in range(4):
@@ -123,18 +188,9 @@ async def show_stats(message: types.Message):
             start_day = end_day - timedelta(days=6)
             week_ranges.append((start_day, end_day))
 
-            week_totals = {"calories": 0, "protein": 0, "fat": 0, "carbs": 0}
-            days_count = 0
-            for i in range(7):
-                day = start_day + timedelta(days=i)
-                day_total = csv_client.get_daily_totals(user_id, day.isoformat())
-                if has_nonzero_values(day_total, ["calories", "protein", "fat", "carbs"]):
-                    for k in week_totals:
-                        week_totals[k] += safe_int(day_total[k])
-                    days_count += 1
-            if days_count > 0:
-                for k in week_totals:
-                    week_totals[k] = int(week_totals[k] / days_count)
+            avg = average_per_day(await storage.get_range_totals(user_id, start_day.isoformat(), end_day.isoformat()))
+            week_totals = {k: int(v) for k, v in avg.items()} if avg else \
+                {"calories": 0, "protein": 0, "fat": 0, "carbs": 0}
             weeks.append(week_totals)
 
         valid_weeks = [w for w in weeks if has_nonzero_values(w, ["calories","protein","fat","carbs"])]
@@ -164,11 +220,57 @@ async def show_stats(message: types.Message):
         await message.answer(text, reply_markup=ReplyKeyboardRemove())
         return
 
+# --- Месяц / год: скользящий период, заканчивающийся сегодня ---
+@router.message(F.text.in_(set(RANGE_PERIODS)))
+async def show_range_stats(message: types.Message):
+    user = await storage.get_user(message.from_user.id)
+    if not user:
+        await message.answer("Сначала нужно зарегистрироваться. Напиши /start", reply_markup=ReplyKeyboardRemove())
+        return
+
+    today = date.today()
+    start = today - timedelta(days=RANGE_PERIODS[message.text] - 1)
+    await message.answer(await format_range_stats(user, start, today), reply_markup=ReplyKeyboardRemove())
+
+# --- Свой период ---
+@router.message(F.text == CUSTOM_PERIOD)
+async def ask_custom_range(message: types.Message, state: FSMContext):
+    if not await storage.user_exists(message.from_user.id):
+        await message.answer("Сначала нужно зарегистрироваться. Напиши /start", reply_markup=ReplyKeyboardRemove())
+        return
+
+    await state.set_state(StatsRange.waiting_range)
+    await message.answer(
+        "Укажи период через дефис, например 01.09.2025 - 30.09.2025 или 01.09 - 30.09",
+        reply_markup=ReplyKeyboardRemove()
+    )
+
+@router.message(StatsRange.waiting_range)
+async def show_custom_range(message: types.Message, state: FSMContext):
+    text = (message.text or "").strip()
+    if "отмена" in text.lower():
+        await message.answer("❌ Статистика отменена.")
+        await state.clear()
+        return
+
+    period = parse_date_range(text, date.today())
+    if period is None:
+        await message.answer("⚠️ Неверный формат. Пример: 01.09.2025 - 30.09.2025 (или напиши 'отмена')")
+        return
+
+    await state.clear()
+    user = await storage.get_user(message.from_user.id)
+    if not user:
+        await message.answer("Сначала нужно зарегистрироваться. Напиши /start")
+        return
+    await message.answer(await format_range_stats(user, *period))
+    log_event("stats_custom_range", message.from_user.id, extra_info=f"{period[0]}..{period[1]}")
+
 # --- /goal ---
 @router.message(F.text == "/goal")
 async def show_current_goal(message: types.Message):
     user_id = message.from_user.id
-    user = csv_client.get_user(user_id)
+    user = await storage.get_user(user_id)
 
     if not user:
         await message.answer("Сначала нужно зарегистрироваться. Напиши /start")
@@ -2,15 +2,29 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from app.config import TELEGRAM_TOKEN_TEST, TELEGRAM_TOKEN
+from app.config import (
+    TELEGRAM_TOKEN_TEST, TELEGRAM_TOKEN, GSHEET_REPLICATION, BOT_MODE,
+    FSM_STORAGE, FSM_SQLITE_PATH, FSM_TTL_HOURS,
+)
 from app.handlers import registration, meals, statistics, meals_delete, help, restart, admin
 from app.services.commands import set_default_commands
+from app.services.storage import get_storage, get_async_storage, run_meal_compactor
+from app.services.replication import start_replication
+from app.services.openai_client import close_client
+from app.services.llm_metrics import llm_metrics
+from app.services.webhook import run_webhook
+from app.services.fsm_storage import SQLiteFSMStorage
 
 
 # --- Инициализация ---
 bot = Bot(token=TELEGRAM_TOKEN_TEST)
 # bot = Bot(token=TELEGRAM_TOKEN)
-storage = MemoryStorage()
+if FSM_STORAGE == "sqlite":
+    # состояния диалогов переживают перезапуск, брошенные удаляются по TTL;
+    # несохранённые изменения сбрасываются на диск в dp.shutdown (storage.close)
+    storage = SQLiteFSMStorage(FSM_SQLITE_PATH, ttl=FSM_TTL_HOURS * 3600)
+else:
+    storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
 
@@ -31,7 +45,28 @@ async def main():
     # 👇 устанавливаем меню команд в Telegram
     await set_default_commands(bot)
 
-    await dp.start_polling(bot)
+    # 👇 фоновое сжатие журнала приёмов пищи
+    compactor = asyncio.create_task(run_meal_compactor(get_storage()))
+    # 👇 фоновая отправка изменений в Google Sheets (локальное хранилище остаётся основным)
+    replicator = start_replication(get_async_storage()) if GSHEET_REPLICATION else None
+    # 👇 периодический снимок телеметрии модели в logs/llm_metrics.jsonl
+    metrics_dumper = asyncio.create_task(llm_metrics.run_dump())
+
+    try:
+        if BOT_MODE == "webhook":
+            # 👇 Telegram сам присылает апдейты на наш HTTP-сервер
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        compactor.cancel()
+        metrics_dumper.cancel()
+        llm_metrics.dump()
+        if replicator is not None:
+            replicator.cancel()
+        # дописываем всё, что осталось в очереди записи
+        await get_async_storage().close()
+        await close_client()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.services.csv_client import CSVClient, MACROS, safe_float
+from app.services.range_index import day_ordinal
+from app.services.sharded_client import ShardedCSVClient
+
+
+class ColumnarMealStore:
+    """
+    Колоночное представление приёмов пищи для аналитики по всей базе:
+    user_id — int64, day — int32 (date.toordinal()), макросы — float32 (колонки в порядке MACROS).
+    При создании строки один раз сортируются по (user_id, day); после этого все
+    группировки — линейные проходы (границы серий + np.add.reduceat) без циклов по строкам.
+    """
+
+    def __init__(self, user_id: np.ndarray, day: np.ndarray, macros: np.ndarray, presorted=False):
+        user_id = np.asarray(user_id, dtype=np.int64)
+        day = np.asarray(day, dtype=np.int32)
+        macros = np.asarray(macros, dtype=np.float32).reshape(-1, len(MACROS))
+        if not presorted and len(day):
+            span = int(day.max()) - int(day.min()) + 1
+            order = np.argsort(user_id * span + (day - day.min()))
+            user_id, day, macros = user_id[order], day[order], macros[order]
+        self.user_id = user_id
+        self.day = day
+        self.macros = macros
+        self._daily = None
+
+    def __len__(self):
+        return len(self.user_id)
+
+    # --- Загрузка ---
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty((0, len(MACROS)), np.float32))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """DataFrame с колонками user_id, date и MACROS (строки/числа)."""
+        if df.empty:
+            return cls.empty()
+        user_id = pd.to_numeric(df["user_id"], errors="coerce")
+        day = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+        valid = user_id.notna() & day.notna()
+        # ordinal = дни от 1970-01-01 + ordinal(1970-01-01)
+        ordinal = (day[valid].values.astype("datetime64[D]").astype(np.int64)
+                   + date(1970, 1, 1).toordinal())
+        macros = np.column_stack([
+            pd.to_numeric(df.loc[valid, k], errors="coerce").fillna(0.0).to_numpy(np.float32) for k in MACROS
+        ])
+        return cls(user_id[valid].to_numpy(np.int64), ordinal, macros)
+
+    @classmethod
+    def from_csv_log(cls, meals_file):
+        """Журнал CSVClient: надгробия и удалённые ими приёмы отбрасываются векторно."""
+        return cls.from_frame(_drop_tombstones(pd.read_csv(meals_file, dtype=str, keep_default_na=False)))
+
+    @classmethod
+    def from_records(cls, meals: list[dict]):
+        if not meals:
+            return cls.empty()
+        return cls.from_frame(pd.DataFrame.from_records(meals))
+
+    @classmethod
+    def from_storage(cls, storage):
+        """Строит колонки из хранилища, по возможности минуя построчный разбор."""
+        if isinstance(storage, ShardedCSVClient):
+            frames = [pd.read_csv(storage.shard_path(user_id), dtype=str, keep_default_na=False)
+                      for user_id in storage._shard_ids()]
+            return cls.from_frame(_drop_tombstones(pd.concat(frames))) if frames else cls.empty()
+        if isinstance(storage, CSVClient):
+            return cls.from_csv_log(storage.meals_file)
+        conn = getattr(storage, "conn", None)
+        if conn is not None:
+            with storage.lock:
+                df = pd.read_sql_query("SELECT user_id, date, calories, protein, fat, carbs FROM meals", conn)
+            return cls.from_frame(df)
+        return cls.from_records(storage.get_meals())
+
+    # --- Ядра ---
+    def between(self, start: str, end: str):
+        """Подмножество приёмов за период [start, end] (даты ISO)."""
+        mask = (self.day >= day_ordinal(start)) & (self.day <= day_ordinal(end))
+        return ColumnarMealStore(self.user_id[mask], self.day[mask], self.macros[mask], presorted=True)
+
+    @staticmethod
+    def _group_sum(keys: list[np.ndarray], values: np.ndarray):
+        """
+        Сумма values по сериям одинаковых keys (данные уже упорядочены по keys).
+        Возвращает (ключи групп, суммы в float64).
+        """
+        if not len(values):
+            return [k[:0] for k in keys], np.empty((0, values.shape[1]), np.float64)
+        change = np.zeros(len(values), dtype=bool)
+        change[0] = True
+        for k in keys:
+            change[1:] |= k[1:] != k[:-1]
+        starts = np.flatnonzero(change)
+        sums = np.add.reduceat(values.astype(np.float64), starts, axis=0)
+        return [k[starts] for k in keys], sums
+
+    def daily_totals(self):
+        """Суточные итоги всех пользователей: (user_id, day, суммы[n, 4]). Кэшируется."""
+        if self._daily is None:
+            (user_id, day), sums = self._group_sum([self.user_id, self.day], self.macros)
+            self._daily = user_id, day, sums
+        return self._daily
+
+    def weekly_averages(self):
+        """
+        Средние за день по неделям (пн–вс) для каждого пользователя, только по дням с записями:
+        (user_id, week_start_ordinal, средние[n, 4], дней с записями).
+        """
+        user_id, day, sums = self.daily_totals()
+        nonzero = sums.any(axis=1)
+        user_id, day, sums = user_id[nonzero], day[nonzero], sums[nonzero]
+        week = (day - 1) // 7 * 7 + 1  # ordinal 1 (0001-01-01) — понедельник
+        values = np.column_stack([sums, np.ones(len(sums))])
+        (w_user, w_start), w_sums = self._group_sum([user_id, week], values)
+        days = w_sums[:, -1]
+        return w_user, w_start, w_sums[:, :-1] / days[:, None], days.astype(np.int32)
+
+    def user_averages(self):
+        """Среднесуточные значения каждого пользователя по дням с записями: (user_id, средние, дней)."""
+        user_id, _, sums = self.daily_totals()
+        nonzero = sums.any(axis=1)
+        values = np.column_stack([sums[nonzero], np.ones(int(nonzero.sum()))])
+        (u_id,), u_sums = self._group_sum([user_id[nonzero]], values)
+        days = u_sums[:, -1]
+        return u_id, u_sums[:, :-1] / days[:, None], days.astype(np.int32)
+
+    def cohort_summary(self) -> dict:
+        """Сводка по всей базе: активные пользователи, дни с записями, распределение калорий."""
+        _, _, sums = self.daily_totals()
+        sums = sums[sums.any(axis=1)]
+        user_ids, user_avg, _ = self.user_averages()
+        if not len(sums):
+            return {"users": 0, "user_days": 0, "meals": len(self)}
+        calories = sums[:, 0]
+        return {
+            "users": int(len(user_ids)),
+            "user_days": int(len(sums)),
+            "meals": int(len(self)),
+            "avg": dict(zip(MACROS, (float(v) for v in sums.mean(axis=0)))),
+            "calories_median": float(np.median(calories)),
+            "calories_p90": float(np.percentile(calories, 90)),
+            "user_avg_calories_median": float(np.median(user_avg[:, 0])),
+        }
+
+
+def _drop_tombstones(df: pd.DataFrame) -> pd.DataFrame:
+    """Убирает из журнала надгробия и удалённые ими приёмы (meal_id уникальны в пределах файла)."""
+    if "deleted" not in df.columns:
+        return df
+    tomb = df["deleted"] == "1"
+    dead = df.loc[tomb, ["user_id", "meal_id"]].itertuples(index=False, name=None)
+    keys = pd.MultiIndex.from_frame(df[["user_id", "meal_id"]])
+    return df[~tomb & ~keys.isin(list(dead))]
+
+
+def targets_hit_share(store: ColumnarMealStore, users: list[dict], tolerance=0.1) -> float:
+    """
+    Доля пользователей, чьи среднесуточные калории в пределах ±tolerance от цели target_cal.
+    Учитываются только пользователи с целью и записями.
+    """
+    user_ids, user_avg, _ = store.user_averages()
+    targets = {int(u["user_id"]): safe_float(u.get("target_cal")) for u in users}
+    target = np.array([targets.get(int(uid), 0.0) for uid in user_ids], dtype=np.float64)
+    has_target = target > 0
+    if not has_target.any():
+        return 0.0
+    deviation = np.abs(user_avg[has_target, 0] - target[has_target]) / target[has_target]
+    return float((deviation <= tolerance).mean())
@@ -3,7 +3,7 @@ from aiogram.types import BotCommand, BotCommandScopeDefault
 
 # --- Список всех команд в одном месте ---
 COMMANDS = [
-    ("statistics", "Статистика за день, неделю, 4 недели"),
+    ("statistics", "Статистика за день, неделю, месяц, год или свой период"),
     ("goal", "Посмотреть текущую цель"),
     ("update_goal", "Изменить цель"),
     ("delete_last_meal", "Удалить последний приём пищи"),
@@ -1,9 +1,27 @@
 import csv
+import os
+import threading
 from pathlib import Path
 from datetime import date
 
+from app.services.file_cache import CSVFileCache, APPENDED, RELOADED
+from app.services.range_index import DailyRangeIndex, day_ordinal
+
 USERS_FILE = Path("data/users.csv")
 MEALS_FILE = Path("data/meals.csv")
+TOTALS_FILE = Path("data/daily_totals.csv")
+
+USER_FIELDS = ["user_id", "age", "sex", "height", "weight", "activity", "goal",
+               "target_cal", "p_goal", "f_goal", "c_goal"]
+MEAL_FIELDS = ["user_id", "date", "meal_text", "protein", "fat", "carbs", "calories"]
+MEAL_LOG_FIELDS = [*MEAL_FIELDS, "meal_id", "deleted"]
+MACROS = ("calories", "protein", "fat", "carbs")
+TOTALS_FIELDS = ["user_id", "date", *MACROS]
+
+# Сжимаем журнал приёмов, когда мёртвых записей больше этой доли (и не меньше COMPACT_MIN_DEAD)
+COMPACT_DEAD_RATIO = 0.3
+COMPACT_MIN_DEAD = 100
+
 
 def safe_float(value, default=0.0):
     """Преобразует значение в float, пустые/некорректные значения -> default."""
@@ -12,105 +30,698 @@ def safe_float(value, default=0.0):
     except (ValueError, TypeError):
         return float(default)
 
+
+class UserProfile:
+    """Компактный профиль пользователя. Поля хранятся строками, как в CSV."""
+    __slots__ = tuple(USER_FIELDS)
+
+    def __init__(self, user_id: int, **fields):
+        self.user_id = int(user_id)
+        for name in USER_FIELDS[1:]:
+            value = fields.get(name, "")
+            setattr(self, name, "" if value is None else str(value))
+
+    @classmethod
+    def from_row(cls, row):
+        """Создаёт профиль из строки CSV (dict или list в порядке USER_FIELDS)."""
+        if not isinstance(row, dict):
+            row = dict(zip(USER_FIELDS, row))
+        fields = {k: row.get(k, "") for k in USER_FIELDS[1:]}
+        return cls(int(row["user_id"]), **fields)
+
+    def to_dict(self) -> dict:
+        """Словарь в формате csv.DictReader (все значения — строки)."""
+        return {name: str(getattr(self, name)) for name in USER_FIELDS}
+
+    def to_row(self) -> list:
+        return [getattr(self, name) for name in USER_FIELDS]
+
+
+class UserRegistry:
+    """
+    Общий для процесса реестр пользователей: user_id -> UserProfile.
+    Перед каждым обращением файл проверяется одним stat(): дописанные строки
+    разбираются с последнего смещения, переписанный файл читается заново.
+    """
+
+    def __init__(self, users_file):
+        self.users_file = users_file
+        self.cache = CSVFileCache(users_file)
+        self.lock = threading.RLock()
+        self._users: dict[int, UserProfile] = {}
+
+    def refresh(self):
+        with self.lock:
+            status, rows = self.cache.poll()
+            if status == RELOADED:
+                self._users = {}
+            for row in rows:
+                try:
+                    profile = UserProfile.from_row(row)
+                except (KeyError, ValueError, TypeError):
+                    # повреждённая строка — пропускаем
+                    continue
+                self._users[profile.user_id] = profile
+
+    def exists(self, user_id) -> bool:
+        self.refresh()
+        return int(user_id) in self._users
+
+    def get(self, user_id):
+        self.refresh()
+        return self._users.get(int(user_id))
+
+    def add(self, profile: UserProfile):
+        """Дописывает профиль в users.csv."""
+        with self.lock:
+            self.refresh()
+            self.cache.append_rows([profile.to_row()])
+            self._users[profile.user_id] = profile
+
+    def remove(self, user_id):
+        with self.lock:
+            self.refresh()
+            self._users.pop(int(user_id), None)
+            self.write_all(self._users.values())
+
+    def write_all(self, profiles):
+        """Переписывает users.csv списком профилей."""
+        with self.lock:
+            profiles = list(profiles)
+            with open(self.users_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(USER_FIELDS)
+                writer.writerows(p.to_row() for p in profiles)
+            self.cache.mark_rewritten(USER_FIELDS)
+            self._users = {p.user_id: p for p in profiles}
+
+    def ids(self) -> list[int]:
+        self.refresh()
+        return list(self._users)
+
+    def profiles(self) -> list[UserProfile]:
+        self.refresh()
+        return list(self._users.values())
+
+
+class MealLog:
+    """
+    Журнал приёмов пищи (meals.csv) в режиме "только дописывание".
+    Каждый приём получает монотонный meal_id; удаление дописывает запись-надгробие
+    (deleted=1) с тем же meal_id. Файл переписывается только при сжатии (compact),
+    когда доля мёртвых записей превышает порог.
+
+    В памяти: живые приёмы meal_id -> meal и индексы
+    user_id -> {meal_id}, (user_id, date) -> {meal_id} (dict как упорядоченное множество).
+    Изменения файла другими процессами подхватываются через CSVFileCache
+    и передаются подписчикам (DailyRollup).
+    """
+
+    def __init__(self, meals_file):
+        self.meals_file = meals_file
+        self.cache = CSVFileCache(meals_file)
+        self.listeners = []
+        self.lock = threading.RLock()
+        self._rows: dict[int, dict] = {}
+        self._by_user: dict[int, dict[int, None]] = {}
+        self._by_user_day: dict[tuple[int, str], dict[int, None]] = {}
+        self._next_id = 1
+        self._records = 0   # всего записей в файле
+        self._dead = 0      # удалённые приёмы + надгробия
+        self._pending: list | None = None  # записи, дописанные во время сжатия
+
+    # --- Загрузка ---
+    def refresh(self):
+        """Подтягивает изменения файла: один stat(), если файл не менялся."""
+        with self.lock:
+            status, records = self.cache.poll()
+            if status == RELOADED:
+                if "meal_id" not in (self.cache.fieldnames or []):
+                    # старый формат без meal_id: нумеруем строки и один раз переписываем файл
+                    self.replace_all(records)
+                    return
+                self._reset()
+                for record in records:
+                    self._apply_record(record)
+                for listener in self.listeners:
+                    listener.on_meals_reloaded()
+            elif status == APPENDED:
+                changes = [c for c in map(self._apply_record, records) if c]
+                for listener in self.listeners:
+                    listener.on_meals_appended(changes)
+
+    def _reset(self):
+        self._rows = {}
+        self._by_user = {}
+        self._by_user_day = {}
+        self._next_id = 1
+        self._records = 0
+        self._dead = 0
+
+    def _apply_record(self, record: dict):
+        """Применяет запись журнала; возвращает (+1, meal) / (-1, meal) или None."""
+        self._records += 1
+        try:
+            meal_id = int(record["meal_id"])
+        except (KeyError, ValueError, TypeError):
+            # повреждённая запись остаётся в файле до сжатия, но не индексируется
+            self._dead += 1
+            return
+        self._next_id = max(self._next_id, meal_id + 1)
+        if record.get("deleted") == "1":
+            self._dead += 1
+            meal = self._unindex(meal_id)
+            if meal is None:
+                return None
+            self._dead += 1
+            return -1, meal
+        meal = {k: record.get(k) or "" for k in MEAL_FIELDS}
+        meal["meal_id"] = str(meal_id)
+        self._index(meal_id, meal)
+        return 1, meal
+
+    def _index(self, meal_id: int, meal: dict):
+        self._rows[meal_id] = meal
+        try:
+            user_id = int(meal["user_id"])
+        except (KeyError, ValueError, TypeError):
+            return
+        self._by_user.setdefault(user_id, {})[meal_id] = None
+        self._by_user_day.setdefault((user_id, meal.get("date") or ""), {})[meal_id] = None
+
+    def _unindex(self, meal_id: int):
+        meal = self._rows.pop(meal_id, None)
+        if meal is None:
+            return None
+        try:
+            user_id = int(meal["user_id"])
+        except (KeyError, ValueError, TypeError):
+            return meal
+        for index, key in ((self._by_user, user_id), (self._by_user_day, (user_id, meal.get("date") or ""))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(meal_id, None)
+                if not ids:
+                    del index[key]
+        return meal
+
+    # --- Запись ---
+    def _append_records(self, records: list[list]):
+        # журнал — единственный источник правды, поэтому каждая группа записей фиксируется fsync
+        self.cache.append_rows(records, sync=True)
+        self._records += len(records)
+        if self._pending is not None:
+            self._pending.extend(records)
+
+    def append(self, meal: dict) -> int:
+        """Дописывает приём, возвращает его meal_id."""
+        return self.append_many([meal])[0]
+
+    def append_many(self, meals: list[dict]) -> list[int]:
+        """Дописывает приёмы одной записью (один write + fsync), возвращает их meal_id по порядку."""
+        with self.lock:
+            self.refresh()
+            records, indexed = [], []
+            for meal in meals:
+                meal_id = self._next_id
+                self._next_id += 1
+                meal = {k: meal.get(k, "") for k in MEAL_FIELDS}
+                meal["meal_id"] = str(meal_id)
+                records.append([*(meal[k] for k in MEAL_FIELDS), meal_id, ""])
+                indexed.append((meal_id, meal))
+            if records:
+                self._append_records(records)
+            for meal_id, meal in indexed:
+                self._index(meal_id, meal)
+            return [meal_id for meal_id, _ in indexed]
+
+    def delete(self, meal_ids) -> list[dict]:
+        """Дописывает надгробия для живых приёмов из meal_ids, возвращает удалённые записи."""
+        with self.lock:
+            self.refresh()
+            removed = []
+            for meal_id in meal_ids:
+                meal = self._unindex(int(meal_id))
+                if meal is not None:
+                    removed.append(meal)
+            if removed:
+                self._append_records([[meal["user_id"], meal.get("date", ""), "", "", "", "", "",
+                                       meal["meal_id"], "1"] for meal in removed])
+                self._dead += 2 * len(removed)
+            return removed
+
+    def _write(self, path, rows: list[list]):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(MEAL_LOG_FIELDS)
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _live_rows(self) -> list[list]:
+        rows = [[*(m[k] for k in MEAL_FIELDS), meal_id, ""] for meal_id, m in self._rows.items()]
+        # надгробие последнего выданного id сохраняем, чтобы id не переиспользовались
+        last_id = self._next_id - 1
+        if last_id > 0 and last_id not in self._rows:
+            rows.append(["", "", "", "", "", "", "", last_id, "1"])
+        return rows
+
+    def replace_all(self, meals: list[dict]):
+        """Полная перезапись журнала (save_meals). Записи без meal_id получают новые id."""
+        with self.lock:
+            next_id = self._next_id
+            self._reset()
+            for meal in meals:
+                try:
+                    meal_id = int(meal.get("meal_id"))
+                except (ValueError, TypeError):
+                    meal_id = None
+                if meal_id is None or meal_id in self._rows:
+                    meal_id = next_id
+                next_id = max(next_id, meal_id + 1)
+                row = {k: "" if meal.get(k) is None else str(meal.get(k)) for k in MEAL_FIELDS}
+                row["meal_id"] = str(meal_id)
+                self._index(meal_id, row)
+            self._next_id = next_id
+            rows = self._live_rows()
+            self._write(self.meals_file, rows)
+            self.cache.mark_rewritten(MEAL_LOG_FIELDS)
+            self._records = len(rows)
+            self._dead = len(rows) - len(self._rows)
+            for listener in self.listeners:
+                listener.on_meals_reloaded()
+
+    # --- Сжатие ---
+    def dead_ratio(self) -> float:
+        self.refresh()
+        return self._dead / self._records if self._records else 0.0
+
+    def dead_count(self) -> int:
+        self.refresh()
+        return self._dead
+
+    def compact(self) -> bool:
+        """
+        Переписывает журнал только живыми приёмами. Снимок пишется во временный файл
+        без блокировки; записи, дописанные за это время, добавляются под блокировкой
+        перед атомарной заменой файла.
+        """
+        with self.lock:
+            self.refresh()
+            if self._pending is not None:
+                return False
+            rows = self._live_rows()
+            self._pending = []
+        tmp_path = f"{self.meals_file}.compact"
+        try:
+            self._write(tmp_path, rows)
+            with self.lock:
+                if self._pending:
+                    with open(tmp_path, "a", newline="", encoding="utf-8") as f:
+                        csv.writer(f).writerows(self._pending)
+                os.replace(tmp_path, self.meals_file)
+                self.cache.mark_rewritten(MEAL_LOG_FIELDS)
+                self._records = len(rows) + len(self._pending)
+                self._dead = self._records - len(self._rows)
+        finally:
+            with self.lock:
+                self._pending = None
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+    # --- Чтение ---
+    def all(self) -> list[dict]:
+        with self.lock:
+            self.refresh()
+            return list(self._rows.values())
+
+    def get(self, meal_id: int):
+        with self.lock:
+            self.refresh()
+            return self._rows.get(int(meal_id))
+
+    def user_meals(self, user_id) -> list[tuple[int, dict]]:
+        """[(meal_id, meal), ...] пользователя по порядку добавления."""
+        with self.lock:
+            self.refresh()
+            return [(i, self._rows[i]) for i in self._by_user.get(int(user_id), ())]
+
+    def last(self, user_id):
+        """(meal_id, meal) последнего приёма пользователя или None."""
+        with self.lock:
+            self.refresh()
+            ids = self._by_user.get(int(user_id))
+            if not ids:
+                return None
+            meal_id = next(reversed(ids))
+            return meal_id, self._rows[meal_id]
+
+    def day_meals(self, user_id, for_date: str) -> list[dict]:
+        with self.lock:
+            self.refresh()
+            return [self._rows[i] for i in self._by_user_day.get((int(user_id), for_date), ())]
+
+    def user_meal_ids(self, user_id) -> list[int]:
+        with self.lock:
+            self.refresh()
+            return list(self._by_user.get(int(user_id), ()))
+
+
+class DailyRollup:
+    """
+    Материализованные суточные итоги: (user_id, date) -> калории/БЖУ.
+    Хранится в daily_totals.csv в режиме "последняя строка побеждает":
+    каждое изменение дописывает новые итоги дня, нулевая строка означает удаление.
+    Файл сжимается при загрузке, если устаревших строк больше, чем актуальных.
+    Для запросов за произвольный период по пользователю лениво строится
+    DailyRangeIndex (калории/БЖУ + число дней с записями).
+    Подписан на MealLog: изменения meals.csv извне попадают в итоги сразу.
+    totals_file=None — итоги только в памяти и пересчитываются из журнала при загрузке
+    (так работают небольшие журналы-шарды одного пользователя).
+    Итоги читаются из пула потоков AsyncStorage, поэтому все входы берут блокировку
+    журнала: итоги меняются вместе с ним, и порядок блокировок всегда один.
+    """
+
+    def __init__(self, totals_file, meals: MealLog):
+        self.totals_file = totals_file
+        self.meals = meals
+        self.lock = meals.lock
+        self._days: dict[int, dict[str, list[float]]] = {}
+        self._ranges: dict[int, DailyRangeIndex] = {}
+        self._loaded = False
+        meals.listeners.append(self)
+
+    def on_meals_appended(self, changes):
+        with self.lock:
+            if not self._loaded:
+                return
+            rows = [row for row in (self._apply(meal, sign) for sign, meal in changes) if row]
+            if rows:
+                self._append(rows)
+
+    def on_meals_reloaded(self):
+        with self.lock:
+            if self._loaded:
+                self.rebuild(self.meals.all())
+
+    def ensure_loaded(self):
+        with self.lock:
+            # сначала подтягиваем журнал приёмов: внешние изменения придут через on_meals_*
+            self.meals.refresh()
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        # итоги пишутся после meals.csv, поэтому более старый файл итогов — устаревший
+        if (self.totals_file is None or not os.path.exists(self.totals_file)
+                or os.path.getmtime(self.totals_file) < os.path.getmtime(self.meals.meals_file)):
+            self.rebuild(self.meals.all())
+            return
+
+        rows = 0
+        with open(self.totals_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    user_id = int(row["user_id"])
+                except (KeyError, ValueError, TypeError):
+                    continue
+                rows += 1
+                totals = [safe_float(row.get(k)) for k in MACROS]
+                days = self._days.setdefault(user_id, {})
+                if any(totals):
+                    days[row["date"]] = totals
+                else:
+                    days.pop(row["date"], None)
+        self._loaded = True
+        if rows > 2 * self._count():
+            self._write_all()
+
+    def _count(self) -> int:
+        return sum(len(days) for days in self._days.values())
+
+    def _write_all(self):
+        if self.totals_file is None:
+            return
+        with open(self.totals_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(TOTALS_FIELDS)
+            for user_id, days in self._days.items():
+                for day, totals in days.items():
+                    writer.writerow([user_id, day, *(round(v, 3) for v in totals)])
+
+    def _append(self, rows: list):
+        if self.totals_file is None:
+            return
+        with open(self.totals_file, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+    def rebuild(self, meals: list[dict]):
+        """Полный пересчёт из списка приёмов (используется при загрузке и save_meals)."""
+        with self.lock:
+            self._days = {}
+            self._ranges = {}
+            for meal in meals:
+                self._apply(meal, 1)
+            self._loaded = True
+            self._write_all()
+
+    def _apply(self, meal: dict, sign: int):
+        try:
+            user_id = int(meal["user_id"])
+        except (KeyError, ValueError, TypeError):
+            return None
+        day = meal.get("date") or ""
+        days = self._days.setdefault(user_id, {})
+        existed = day in days
+        totals = days.setdefault(day, [0.0, 0.0, 0.0, 0.0])
+        delta = [sign * safe_float(meal.get(k, 0)) for k in MACROS]
+        for i, v in enumerate(delta):
+            totals[i] += v
+        if not any(round(v, 3) for v in totals):
+            del days[day]
+            totals = [0.0, 0.0, 0.0, 0.0]
+
+        ranges = self._ranges.get(user_id)
+        ordinal = day_ordinal(day)
+        if ranges is not None and ordinal is not None:
+            ranges.add(ordinal, [*delta, int(day in days) - int(existed)])
+        return [user_id, day, *(round(v, 3) for v in totals)]
+
+    def add_meal(self, meal: dict):
+        self.add_meals([meal])
+
+    def add_meals(self, meals: list[dict]):
+        with self.lock:
+            self.ensure_loaded()
+            rows = [row for row in (self._apply(meal, 1) for meal in meals) if row]
+            if rows:
+                self._append(rows)
+
+    def remove_meal(self, meal: dict):
+        with self.lock:
+            self.ensure_loaded()
+            row = self._apply(meal, -1)
+            if row:
+                self._append([row])
+
+    def remove_user(self, user_id):
+        with self.lock:
+            self.ensure_loaded()
+            days = self._days.pop(int(user_id), {})
+            self._ranges.pop(int(user_id), None)
+            if days:
+                self._append([[int(user_id), day, 0, 0, 0, 0] for day in days])
+
+    def get(self, user_id, for_date: str) -> dict:
+        with self.lock:
+            self.ensure_loaded()
+            totals = self._days.get(int(user_id), {}).get(for_date)
+            if totals is None:
+                return {k: 0.0 for k in MACROS}
+            return dict(zip(MACROS, totals))
+
+    def user_days(self, user_id) -> dict[str, list[float]]:
+        """Копия итогов пользователя по дням (внутренние списки меняются при записи)."""
+        with self.lock:
+            self.ensure_loaded()
+            return {day: list(totals) for day, totals in self._days.get(int(user_id), {}).items()}
+
+    def range_totals(self, user_id, start: str, end: str) -> dict:
+        """Суммы калорий/БЖУ за период [start, end] и число дней с записями ("days")."""
+        user_id = int(user_id)
+        with self.lock:
+            self.ensure_loaded()
+            ranges = self._ranges.get(user_id)
+            if ranges is None:
+                # индекс публикуется только целиком: _apply дополняет лишь готовые индексы
+                ranges = DailyRangeIndex(len(MACROS) + 1)
+                for day, totals in sorted(self._days.get(user_id, {}).items()):
+                    ordinal = day_ordinal(day)
+                    if ordinal is not None:
+                        ranges.add(ordinal, [*totals, 1])
+                self._ranges[user_id] = ranges
+            sums = ranges.range_sum(day_ordinal(start), day_ordinal(end))
+        result = dict(zip(MACROS, sums))
+        result["days"] = int(round(sums[-1]))
+        return result
+
+
+# Реестры и индексы общие для всех экземпляров CSVClient, работающих с одним файлом
+_user_registries: dict[str, UserRegistry] = {}
+_meal_logs: dict[str, MealLog] = {}
+_rollups: dict[str, DailyRollup] = {}
+
+
+def get_user_registry(users_file) -> UserRegistry:
+    key = os.path.abspath(users_file)
+    registry = _user_registries.get(key)
+    if registry is None:
+        registry = _user_registries[key] = UserRegistry(users_file)
+    return registry
+
+
+def get_meal_log(meals_file) -> MealLog:
+    key = os.path.abspath(meals_file)
+    index = _meal_logs.get(key)
+    if index is None:
+        index = _meal_logs[key] = MealLog(meals_file)
+    return index
+
+
+def get_daily_rollup(totals_file, meals: MealLog) -> DailyRollup:
+    key = os.path.abspath(totals_file)
+    rollup = _rollups.get(key)
+    if rollup is None:
+        rollup = _rollups[key] = DailyRollup(totals_file, meals)
+    return rollup
+
+
 class CSVClient:
-    def __init__(self, users_file=USERS_FILE, meals_file=MEALS_FILE):
+    def __init__(self, users_file=USERS_FILE, meals_file=MEALS_FILE, totals_file=TOTALS_FILE):
         self.users_file = users_file
         self.meals_file = meals_file
         # создаём файлы, если их нет
-        import os, csv
         if not os.path.exists(users_file):
             with open(users_file, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
-                writer.writerow(["user_id","age","sex","height","weight","activity","goal","target_cal","p_goal","f_goal","c_goal"])
+                writer.writerow(USER_FIELDS)
         if not os.path.exists(meals_file):
             with open(meals_file, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
-                writer.writerow(["user_id","date","meal_text","protein","fat","carbs","calories"])
+                writer.writerow(MEAL_LOG_FIELDS)
+        self.users = get_user_registry(users_file)
+        self.meals = get_meal_log(meals_file)
+        self.totals = get_daily_rollup(totals_file, self.meals)
 
     def get_users(self):
-        import csv
-        with open(self.users_file, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return [p.to_dict() for p in self.users.profiles()]
 
     def user_exists(self, user_id):
-        users = self.get_users()
-        return any(int(u["user_id"]) == user_id for u in users)
+        return self.users.exists(user_id)
 
     def add_user(self, user_data):
-        import csv
-        with open(self.users_file, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(user_data)
+        self.users.add(UserProfile.from_row(user_data))
 
     def get_user(self, user_id):
-        users = self.get_users()
-        for u in users:
-            if int(u["user_id"]) == user_id:
-                return u
-        return None
+        profile = self.users.get(user_id)
+        return profile.to_dict() if profile else None
 
     def get_meals(self):
-        with open(self.meals_file, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return self.meals.all()
 
-    def add_meal(self, meal_data):
-        with open(self.meals_file, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(meal_data)
+    def add_meal(self, meal_data) -> int:
+        """Дописывает приём в журнал, возвращает его meal_id."""
+        return self.add_meals([meal_data])[0]
+
+    def add_meals(self, meals_data: list) -> list[int]:
+        """Дописывает несколько приёмов одной записью в журнал (group commit), возвращает их meal_id."""
+        meals = [{k: "" if v is None else str(v) for k, v in zip(MEAL_FIELDS, meal_data)} for meal_data in meals_data]
+        self.totals.ensure_loaded()
+        with self.meals.lock:
+            meal_ids = self.meals.append_many(meals)
+            self.totals.add_meals(meals)
+        return meal_ids
+
+    def get_user_meals(self, user_id) -> list[tuple[int, dict]]:
+        """Все приёмы пользователя по порядку: [(meal_id, meal), ...]."""
+        return self.meals.user_meals(user_id)
+
+    def get_last_meal(self, user_id):
+        """Последний приём пользователя: (meal_id, meal) или None."""
+        return self.meals.last(user_id)
+
+    def get_meals_for_day(self, user_id, for_date=None) -> list[dict]:
+        if for_date is None:
+            for_date = date.today().isoformat()
+        return self.meals.day_meals(user_id, for_date)
+
+    def delete_meal(self, user_id, meal_id: int):
+        """Удаляет приём по meal_id, если он принадлежит пользователю. Возвращает удалённую запись или None."""
+        self.totals.ensure_loaded()
+        with self.meals.lock:
+            meal = self.meals.get(meal_id)
+            if meal is None or meal.get("user_id") != str(user_id):
+                return None
+            self.meals.delete([meal_id])
+            self.totals.remove_meal(meal)
+        return meal
+
+    def delete_user(self, user_id):
+        """Удаляет профиль пользователя и все его приёмы пищи (надгробиями в журнале)."""
+        self.users.remove(user_id)
+
+        self.totals.ensure_loaded()
+        with self.meals.lock:
+            if self.meals.delete(self.meals.user_meal_ids(user_id)):
+                self.totals.remove_user(user_id)
+
+    def compact_meals(self, threshold=COMPACT_DEAD_RATIO, min_dead=COMPACT_MIN_DEAD) -> bool:
+        """Сжимает журнал приёмов, если мёртвых записей накопилось больше порога."""
+        if self.meals.dead_ratio() < threshold or self.meals.dead_count() < min_dead:
+            return False
+        if not self.meals.compact():
+            return False
+        # сжатие не меняет итоги: обновляем mtime, чтобы файл итогов не считался устаревшим
+        if os.path.exists(self.totals.totals_file):
+            os.utime(self.totals.totals_file)
+        return True
 
     def get_daily_totals(self, user_id, for_date=None):
-        """Считаем суммарное БЖУ и калории за день (возвращаем числа float)."""
+        """Суммарное БЖУ и калории за день из таблицы суточных итогов (числа float)."""
         if for_date is None:
             for_date = date.today().isoformat()
+        return self.totals.get(user_id, for_date)
 
-        total = {"calories": 0.0, "protein": 0.0, "fat": 0.0, "carbs": 0.0}
-        for meal in self.get_meals():
-            try:
-                if int(meal["user_id"]) == int(user_id) and meal["date"] == for_date:
-                    total["calories"] += safe_float(meal.get("calories", 0))
-                    total["protein"] += safe_float(meal.get("protein", 0))
-                    total["fat"] += safe_float(meal.get("fat", 0))
-                    total["carbs"] += safe_float(meal.get("carbs", 0))
-            except (KeyError, ValueError, TypeError):
-                # если запись повреждена — пропускаем её
-                continue
-        return total
+    def get_range_totals(self, user_id, start: str, end: str) -> dict:
+        """
+        Суммы калорий/БЖУ за период [start, end] (даты ISO, включительно)
+        и число дней с записями в поле "days" — для расчёта среднего.
+        """
+        return self.totals.range_totals(user_id, start, end)
 
     def update_user_target(self, user_id: int, new_goal: dict):
         """Обновляет цель пользователя (new_goal — dict с ключами goal/target_cal/p_goal/f_goal/c_goal)."""
-        users = self.get_users()
+        with self.users.lock:
+            profile = self.users.get(user_id)
+            if profile is not None:
+                for key in ("goal", "target_cal", "p_goal", "f_goal", "c_goal"):
+                    setattr(profile, key, str(new_goal.get(key, getattr(profile, key))))
+            self.users.write_all(self.users.profiles())
+
+    def save_users(self, users):
+        profiles = []
         for u in users:
             try:
-                if int(u["user_id"]) == int(user_id):
-                    u["goal"] = str(new_goal.get("goal", u.get("goal", "")))
-                    u["target_cal"] = str(new_goal.get("target_cal", u.get("target_cal", "")))
-                    u["p_goal"] = str(new_goal.get("p_goal", u.get("p_goal", "")))
-                    u["f_goal"] = str(new_goal.get("f_goal", u.get("f_goal", "")))
-                    u["c_goal"] = str(new_goal.get("c_goal", u.get("c_goal", "")))
-                    break
-            except (ValueError, TypeError):
+                profiles.append(UserProfile.from_row(u))
+            except (KeyError, ValueError, TypeError):
                 continue
-        self.save_users(users)
-
-    def save_users(self, users):
-        with open(self.users_file, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["user_id", "age", "sex", "height", "weight", "activity", "goal",
-                                                   "target_cal", "p_goal", "f_goal", "c_goal"])
-            writer.writeheader()
-            writer.writerows(users)
+        self.users.write_all(profiles)
 
     def save_meals(self, meals: list[dict]):
-        """Перезаписываем файл meals.csv списком словарей (требует те же поля, что и заголовок)."""
-        import csv
-        fieldnames = ["user_id", "date", "meal_text", "protein", "fat", "carbs", "calories"]
-        with open(self.meals_file, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(meals)
+        """Перезаписываем журнал meals.csv списком словарей (поля MEAL_FIELDS, meal_id сохраняется)."""
+        # итоги пересчитываются подписчиком журнала (DailyRollup.on_meals_reloaded)
+        self.meals.replace_all(meals)
 
     def get_all_user_ids(self):
-        with open("data/users.csv", "r", encoding="utf-8") as f:
-            lines = f.readlines()[1:]  # пропускаем заголовок
-        return [int(line.split(",")[0]) for line in lines if line.strip()]
+        return self.users.ids()
@@ -0,0 +1,94 @@
+import csv
+import io
+import os
+
+UNCHANGED = "unchanged"
+APPENDED = "appended"
+RELOADED = "reloaded"
+
+
+class CSVFileCache:
+    """
+    Отслеживает CSV-файл по (inode, размер, mtime).
+
+    poll() возвращает:
+    - (UNCHANGED, []) — файл не менялся (стоит один stat());
+    - (APPENDED, rows) — файл только дописан: разобран лишь хвост с последнего смещения;
+    - (RELOADED, rows) — файл заменён/переписан: разобран целиком.
+
+    Собственные записи клиента отмечаются через append_rows()/mark_rewritten(),
+    чтобы не разбирать их повторно.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fieldnames: list[str] | None = None
+        self._signature = None
+        self._offset = 0
+
+    @staticmethod
+    def _stat_signature(st):
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _parse(self, data: bytes, header: bool) -> list[dict]:
+        text = io.StringIO(data.decode("utf-8"), newline="")
+        if header:
+            reader = csv.DictReader(text)
+            rows = list(reader)
+            self.fieldnames = list(reader.fieldnames or [])
+            return rows
+        return list(csv.DictReader(text, fieldnames=self.fieldnames))
+
+    def poll(self):
+        st = os.stat(self.path)
+        signature = self._stat_signature(st)
+        if signature == self._signature:
+            return UNCHANGED, []
+
+        appended = (self._signature is not None and self.fieldnames
+                    and st.st_ino == self._signature[0] and st.st_size > self._offset)
+        with open(self.path, "rb") as f:
+            if appended:
+                f.seek(self._offset)
+            data = f.read()
+
+        # разбираем только целые строки: недописанный хвост дочитаем в следующий раз
+        complete = data[:data.rfind(b"\n") + 1]
+        if appended:
+            rows = self._parse(complete, header=False)
+            self._offset += len(complete)
+        else:
+            rows = self._parse(complete, header=True)
+            self._offset = len(complete)
+        self._signature = signature if len(complete) == len(data) else (st.st_ino, self._offset, None)
+        return (APPENDED if appended else RELOADED), rows
+
+    def append_rows(self, rows: list[list], sync=False):
+        """
+        Дописывает строки в файл одним write и сдвигает смещение кэша.
+        sync=True — дождаться fsync (группа строк фиксируется на диске одним вызовом).
+        """
+        buffer = io.StringIO(newline="")
+        csv.writer(buffer).writerows(rows)
+        data = buffer.getvalue().encode("utf-8")
+        with open(self.path, "ab") as f:
+            start = f.tell()
+            f.write(data)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+            end = f.tell()
+            st = os.fstat(f.fileno())
+        if self._signature is not None and start == self._offset:
+            self._offset = end
+            self._signature = self._stat_signature(st)
+        else:
+            # между опросом и записью файл менял кто-то ещё — перечитаем целиком
+            self._signature = None
+
+    def mark_rewritten(self, fieldnames: list[str]):
+        """Файл только что целиком переписан этим процессом."""
+        st = os.stat(self.path)
+        self.fieldnames = list(fieldnames)
+        self._offset = st.st_size
+        self._signature = self._stat_signature(st)
@@ -0,0 +1,197 @@
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from app.services.logger import logger
+
+FSM_DB_FILE = Path("data/fsm.sqlite3")
+# Сколько ключей держать в памяти
+FSM_HOT_SIZE = 1024
+# Через сколько секунд без изменений диалог считается брошенным и удаляется
+FSM_TTL = 24 * 3600
+# Задержка перед сбросом изменений на диск: несколько записей за апдейт — одна запись в файл
+FLUSH_DELAY = 0.5
+# Как часто удалять просроченные записи с диска (секунды)
+SWEEP_INTERVAL = 600
+
+
+class SQLiteFSMStorage(BaseStorage):
+    """
+    Хранилище FSM для aiogram: SQLite (состояние + data в JSON, срок жизни на ключ)
+    с LRU-слоем в памяти.
+
+    Запись меняет только слой в памяти и помечает ключ «грязным»; через FLUSH_DELAY
+    все грязные ключи пишутся одной транзакцией — set_state + update_data в одном
+    хендлере дают одну запись на диск. Срок жизни ключа продлевается при каждом
+    изменении; ttl_by_state задаёт свой срок для состояний с данным префиксом
+    (например, {"Registration": 3 * 24 * 3600}). Просроченные ключи не читаются
+    и периодически удаляются с диска; пустые (без состояния и данных) удаляются сразу.
+    """
+
+    def __init__(self, db_file=FSM_DB_FILE, hot_size=FSM_HOT_SIZE, ttl=FSM_TTL,
+                 ttl_by_state: dict[str, float] = None, flush_delay=FLUSH_DELAY):
+        self.hot_size = hot_size
+        self.ttl = ttl
+        self.ttl_by_state = ttl_by_state or {}
+        self.flush_delay = flush_delay
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # ключ -> [state, data, expires_at]
+        self._hot: OrderedDict[str, list] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_handle = None
+        self._flush_task = None
+        self._swept_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.closed = False
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm(expires_at)")
+
+    # --- Слой в памяти ---
+    def _record(self, key: StorageKey) -> list:
+        name = self.key_builder.build(key)
+        record = self._hot.get(name)
+        if record is None:
+            with self.lock:
+                row = self.conn.execute("SELECT state, data, expires_at FROM fsm WHERE key = ?", (name,)).fetchone()
+            record = [row[0], json.loads(row[1]), row[2]] if row else [None, {}, 0.0]
+            self._hot[name] = record
+        if record[2] and record[2] < time.time():
+            # брошенный диалог: ведём себя так, будто ключа нет
+            record[:] = [None, {}, 0.0]
+            self._dirty.add(name)
+        self._hot.move_to_end(name)
+        self._evict()
+        return record
+
+    def _touch(self, key: StorageKey, record: list):
+        name = self.key_builder.build(key)
+        record[2] = time.time() + self._ttl_for(record[0])
+        self._dirty.add(name)
+        self._schedule_flush()
+
+    def _ttl_for(self, state: Optional[str]) -> float:
+        if state:
+            for prefix, ttl in self.ttl_by_state.items():
+                if state.startswith(prefix):
+                    return ttl
+        return self.ttl
+
+    def _evict(self):
+        """Вытесняет давно не использованные ключи; грязные и текущий остаются до сброса на диск."""
+        if len(self._hot) <= self.hot_size:
+            return
+        for name in list(self._hot)[:-1]:
+            if len(self._hot) <= self.hot_size:
+                break
+            if name not in self._dirty:
+                del self._hot[name]
+
+    # --- Сброс на диск ---
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+        else:
+            self._schedule_flush()
+
+    async def flush(self):
+        """Пишет все изменённые ключи одной транзакцией (в потоке, чтобы не блокировать цикл)."""
+        if not self._dirty:
+            return
+        names, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for name in names:
+            record = self._hot.get(name)
+            if record is None:
+                continue
+            state, data, expires_at = record
+            if state is None and not data:
+                deletes.append((name,))
+            else:
+                upserts.append((name, state, json.dumps(data, ensure_ascii=False), expires_at))
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes)
+        except Exception as e:
+            self._dirty |= names
+            logger.error(f"❌ [SQLiteFSMStorage] Ошибка записи FSM: {e}")
+            self._schedule_flush()
+        self._evict()
+
+    def _write(self, upserts: list, deletes: list):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?)", upserts
+                    )
+                if deletes:
+                    self.conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+                if time.monotonic() - self._swept_at >= SWEEP_INTERVAL:
+                    self.conn.execute("DELETE FROM fsm WHERE expires_at < ?", (time.time(),))
+                    self._swept_at = time.monotonic()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # --- Интерфейс BaseStorage ---
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._record(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        record = self._record(key)
+        record[1] = copy.deepcopy(data)
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy(self._record(key)[1])
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        with self.lock:
+            self.conn.close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            disk = self.conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+        return {"hot_keys": len(self._hot), "dirty_keys": len(self._dirty), "disk_keys": disk}
@@ -1,30 +1,228 @@
-import gspread
+import re
+import threading
+import time
 from datetime import date
-from google.oauth2.service_account import Credentials
-from  app.config import SERVICE_ACCOUNT_FILE, SHEET_NAME
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
+import gspread
+from gspread.utils import rowcol_to_a1
 
+from app.config import SERVICE_ACCOUNT_FILE, SHEET_NAME
+from app.services.csv_client import MACROS, safe_float
+
+# Как часто сверять зеркало с таблицей (секунды); между сверками чтения не ходят в API
+MIRROR_REFRESH_INTERVAL = 60
+
+
+class SheetMirror:
+    """
+    Локальная копия листа: заголовок + строки (dict, значения — строки).
+
+    Первая загрузка — get_all_values(); дальше refresh() не чаще refresh_interval сверяет
+    число строк (col_values(1)) и запрашивает диапазоном только новые строки.
+    Собственные записи (append) сразу попадают в копию. Если номер дописанной строки
+    не совпал с ожидаемым (в таблицу писал кто-то ещё), копия перечитывается целиком.
+    Подписчики (listeners) получают каждую новую строку и сигнал полной перезагрузки.
+    """
+
+    def __init__(self, worksheet, refresh_interval=MIRROR_REFRESH_INTERVAL):
+        self.worksheet = worksheet
+        self.refresh_interval = refresh_interval
+        self.header: list[str] = []
+        self.rows: list[dict] = []
+        self.listeners = []
+        self.lock = threading.RLock()
+        self._loaded = False
+        self._checked_at = 0.0
+
+    # --- Загрузка ---
+    def _reload(self):
+        values = self.worksheet.get_all_values()
+        self.header = [str(h) for h in values[0]] if values else []
+        self.rows = []
+        for listener in self.listeners:
+            listener.on_reset()
+        for row in values[1:]:
+            self._add(row)
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+    def _record(self, values) -> dict:
+        record = {k: str(v) for k, v in zip(self.header, values)}
+        for k in self.header[len(values):]:
+            record[k] = ""
+        return record
+
+    def _add(self, values):
+        record = self._record(values)
+        self.rows.append(record)
+        for listener in self.listeners:
+            listener.on_row(record)
+
+    def _replay(self):
+        """Пересобирает индексы подписчиков после изменения строк не в конце листа."""
+        for listener in self.listeners:
+            listener.on_reset()
+            for record in self.rows:
+                listener.on_row(record)
+
+    def _fetch_tail(self):
+        """Сверяет число строк по колонке A и дочитывает только новые строки."""
+        known = len(self.rows) + 1  # строка 1 — заголовок
+        count = len(self.worksheet.col_values(1))
+        if count < known:
+            # строки удалены вручную — перечитываем целиком
+            self._reload()
+            return
+        if count == known:
+            return
+        last_col = rowcol_to_a1(1, len(self.header)).rstrip("0123456789")
+        for row in self.worksheet.get(f"A{known + 1}:{last_col}{count}"):
+            self._add(row)
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not self._loaded or not self.header:
+                self._reload()
+            elif force or time.monotonic() - self._checked_at >= self.refresh_interval:
+                self._fetch_tail()
+                self._checked_at = time.monotonic()
+
+    # --- Запись ---
+    def append(self, values: list):
+        """Дописывает строку в лист и в копию."""
+        self.append_many([values])
+
+    def append_many(self, rows: list[list]):
+        """Дописывает строки одним запросом append_rows."""
+        if not rows:
+            return
+        with self.lock:
+            self.refresh()
+            expected = len(self.rows) + 2
+            response = self.worksheet.append_rows(rows)
+            if _appended_row(response) == expected:
+                for values in rows:
+                    self._add(values)
+            else:
+                # между нами в лист дописали другие строки — синхронизируемся полностью
+                self._loaded = False
+
+    def update_many(self, updates: dict[int, list]):
+        """Перезаписывает строки {позиция в rows: значения} одним batch_update."""
+        if not updates:
+            return
+        with self.lock:
+            self.worksheet.batch_update([{"range": f"A{pos + 2}", "values": [values]}
+                                         for pos, values in updates.items()])
+            for pos, values in updates.items():
+                self.rows[pos] = self._record(values)
+            self._replay()
+
+    def delete_many(self, positions):
+        """Удаляет строки (позиции в rows) одним batch_update таблицы, снизу вверх."""
+        positions = sorted(set(positions), reverse=True)
+        if not positions:
+            return
+        with self.lock:
+            sheet_id = self.worksheet.id
+            self.worksheet.spreadsheet.batch_update({"requests": [
+                {"deleteDimension": {"range": {"sheetId": sheet_id, "dimension": "ROWS",
+                                               "startIndex": pos + 1, "endIndex": pos + 2}}}
+                for pos in positions
+            ]})
+            for pos in positions:
+                del self.rows[pos]
+            self._replay()
+
+    def set_header(self, header: list[str]):
+        """Записывает строку заголовка (например, добавляет колонку meal_id)."""
+        with self.lock:
+            self.worksheet.update(values=[header], range_name="A1")
+            self.header = list(header)
+            self.rows = [self._record(list(record.values())) for record in self.rows]
+            self._replay()
+
+    def rewrite(self, header: list[str], rows: list[list]):
+        """Полностью заменяет содержимое листа (clear + update)."""
+        with self.lock:
+            self.worksheet.clear()
+            self.worksheet.update(values=[header, *rows], range_name="A1")
+            self.header = list(header)
+            self.rows = [self._record(values) for values in rows]
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            self._replay()
+
+
+class UsersIndex:
+    """user_id -> последняя строка профиля."""
+
+    def __init__(self):
+        self.by_id: dict[str, dict] = {}
+
+    def on_reset(self):
+        self.by_id = {}
+
+    def on_row(self, record: dict):
+        user_id = record.get("user_id", "")
+        if user_id:
+            self.by_id[user_id] = record
+
+
+class MealsIndex:
+    """(user_id, date) -> суточные итоги [калории, белки, жиры, углеводы]."""
 
-class GSheetClient:
     def __init__(self):
-        creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        self.client = gspread.authorize(creds)
-        self.users_sheet = self.client.open(SHEET_NAME).worksheet("users")
-        self.meals_sheet = self.client.open(SHEET_NAME).worksheet("meals")
+        self.totals: dict[tuple[str, str], list[float]] = {}
+
+    def on_reset(self):
+        self.totals = {}
+
+    def on_row(self, record: dict):
+        key = (record.get("user_id", ""), record.get("date", ""))
+        totals = self.totals.setdefault(key, [0.0] * len(MACROS))
+        for i, k in enumerate(MACROS):
+            totals[i] += safe_float(record.get(k))
+
+
+class GSheetClient:
+    """
+    Клиент Google Sheets с локальным зеркалом листов users и meals.
+    В установившемся режиме чтения (user_exists, get_daily_totals, ...) не обращаются к API.
+    Листы можно передать явно — например, in-process заглушки с методами
+    get_all_values / col_values / get / append_rows.
+    """
+
+    def __init__(self, users_sheet=None, meals_sheet=None, refresh_interval=MIRROR_REFRESH_INTERVAL):
+        if users_sheet is None or meals_sheet is None:
+            # таблица открывается один раз на клиента
+            spreadsheet = gspread.service_account(filename=SERVICE_ACCOUNT_FILE).open(SHEET_NAME)
+            users_sheet = users_sheet or spreadsheet.worksheet("users")
+            meals_sheet = meals_sheet or spreadsheet.worksheet("meals")
+        self.users_sheet = users_sheet
+        self.meals_sheet = meals_sheet
+
+        self.users = SheetMirror(users_sheet, refresh_interval)
+        self.users_index = UsersIndex()
+        self.users.listeners.append(self.users_index)
+        self.meals = SheetMirror(meals_sheet, refresh_interval)
+        self.meals_index = MealsIndex()
+        self.meals.listeners.append(self.meals_index)
 
     def get_users(self):
-        return self.users_sheet.get_all_records()
+        self.users.refresh()
+        return list(self.users.rows)
 
     def add_user(self, user_data: list):
-        self.users_sheet.append_row(user_data)
+        self.users.append(user_data)
 
     def user_exists(self, user_id: int) -> bool:
-        users = self.users_sheet.col_values(1)
-        return str(user_id) in users
+        self.users.refresh()
+        return str(user_id) in self.users_index.by_id
+
+    def get_user(self, user_id: int):
+        self.users.refresh()
+        return self.users_index.by_id.get(str(user_id))
 
     def add_user_profile(self, user_id: int, profile: dict):
         self.add_user([
@@ -42,10 +240,11 @@ class GSheetClient:
         ])
 
     def get_meals(self):
-        return self.meals_sheet.get_all_records()
+        self.meals.refresh()
+        return list(self.meals.rows)
 
     def add_meal(self, meal_data: list):
-        self.meals_sheet.append_row(meal_data)
+        self.meals.append(meal_data)
 
     def get_daily_totals(self, user_id: int, for_date: str = None):
         """
@@ -55,22 +254,16 @@ class GSheetClient:
         if for_date is None:
             for_date = date.today().isoformat()
 
-        meals = self.get_meals()
-        total_protein = total_fat = total_carbs = total_calories = 0
-
-        for meal in meals:
-            if str(meal["user_id"]) == str(user_id) and meal["date"] == for_date:
-                total_protein += float(meal.get("protein", 0))
-                total_fat += float(meal.get("fat", 0))
-                total_carbs += float(meal.get("carbs", 0))
-                total_calories += float(meal.get("calories", 0))
-
-        return {
-            "protein": total_protein,
-            "fat": total_fat,
-            "carbs": total_carbs,
-            "calories": total_calories
-        }
-
-gc = gspread.service_account(filename=SERVICE_ACCOUNT_FILE)
-sheet = gc.open(SHEET_NAME).worksheet("users")
+        self.meals.refresh()
+        totals = self.meals_index.totals.get((str(user_id), for_date), [0.0] * len(MACROS))
+        return dict(zip(MACROS, totals))
+
+
+def _appended_row(response):
+    """Номер первой строки из ответа append_rows ({"updates": {"updatedRange": "meals!A12:G12"}}) или None."""
+    try:
+        updated = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    match = re.search(r"![A-Z]+(\d+)", updated)
+    return int(match.group(1)) if match else None
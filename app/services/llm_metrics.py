@@ -0,0 +1,158 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+
+from app.services.logger import LOG_DIR, logger
+
+METRICS_FILE = LOG_DIR / "llm_metrics.jsonl"
+# Как часто сбрасывать снимок метрик в logs/ (секунды)
+DUMP_INTERVAL = 300
+# Верхние границы корзин гистограмм времени (мс); последняя корзина — всё, что дольше
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 60000)
+
+# Какая функция сейчас обращается к модели (ставится в начале get_user_goal / parse_meal_text / ...)
+llm_function = contextvars.ContextVar("llm_function", default="other")
+# Текущий запрос к модели: сюда хук httpx записывает время до первого байта
+current_call = contextvars.ContextVar("current_call", default=None)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; перцентили — по верхней границе корзины."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(self.bounds[i]), self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.total,
+            "avg": self.sum / self.total if self.total else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": dict(zip([*map(str, self.bounds), "inf"], self.counts)),
+        }
+
+
+class FunctionStats:
+    def __init__(self):
+        self.wall_ms = Histogram()
+        self.ttfb_ms = Histogram()
+        self.outcomes = Counter()
+        self.cache_hits = Counter()
+        self.models = Counter()
+        self.events = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def snapshot(self) -> dict:
+        calls = sum(self.outcomes.values())
+        return {
+            "calls": calls,
+            "outcomes": dict(self.outcomes),
+            "error_rate": (calls - self.outcomes["ok"]) / calls if calls else 0.0,
+            "cache_hits": dict(self.cache_hits),
+            "models": dict(self.models),
+            "events": dict(self.events),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "wall_ms": self.wall_ms.snapshot(),
+            "ttfb_ms": self.ttfb_ms.snapshot(),
+        }
+
+
+class LLMMetrics:
+    """
+    Телеметрия запросов к модели по функциям: время целиком и до первого байта,
+    токены, модель, исход (ok / json_error / api_error) и ответы без модели (кэш и т.п.).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.functions: dict[str, FunctionStats] = {}
+
+    def _stats(self, function: str) -> FunctionStats:
+        stats = self.functions.get(function)
+        if stats is None:
+            stats = self.functions[function] = FunctionStats()
+        return stats
+
+    def record_call(self, wall_s: float, outcome: str, ttfb_s=None, model=None, usage=None):
+        with self.lock:
+            stats = self._stats(llm_function.get())
+            stats.outcomes[outcome] += 1
+            stats.wall_ms.observe(wall_s * 1000)
+            if ttfb_s is not None:
+                stats.ttfb_ms.observe(ttfb_s * 1000)
+            if model:
+                stats.models[model] += 1
+            if usage is not None:
+                stats.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                stats.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def record_cache_hit(self, source: str):
+        with self.lock:
+            self._stats(llm_function.get()).cache_hits[source] += 1
+
+    def record_event(self, event: str):
+        """Повтор, хедж, отказ автомата и т.п."""
+        with self.lock:
+            self._stats(llm_function.get()).events[event] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "uptime_s": round(time.time() - self.started_at),
+                "functions": {name: stats.snapshot() for name, stats in self.functions.items()},
+            }
+
+    def dump(self, path=METRICS_FILE):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+    async def run_dump(self, interval=DUMP_INTERVAL):
+        """Периодически дописывает снимок метрик в logs/llm_metrics.jsonl."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.dump)
+            except Exception as e:
+                logger.error(f"❌ [LLMMetrics] Ошибка записи метрик: {e}")
+
+
+async def on_response_headers(response):
+    """Хук httpx: заголовки ответа получены — фиксируем время до первого байта."""
+    call = current_call.get()
+    if call is not None and call.get("ttfb") is None:
+        call["ttfb"] = time.perf_counter() - call["started"]
+
+
+llm_metrics = LLMMetrics()
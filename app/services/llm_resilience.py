@@ -0,0 +1,89 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+import openai
+
+# Ошибки, после которых запрос имеет смысл повторить
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # в т.ч. APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class LLMUnavailable(Exception):
+    """Автомат разомкнут: модель сейчас не вызывается, нужен запасной вариант."""
+
+
+def backoff_delay(attempt: int, base=0.5, cap=8.0) -> float:
+    """Экспоненциальная задержка с полным джиттером: равномерно в [0, base * 2^attempt]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Автомат по последним window вызовам: при доле неудач (ошибки и вызовы дольше
+    slow_call_s) от error_rate и не меньше min_calls вызовов размыкается на cooldown
+    секунд — вызовы сразу получают отказ. Затем пропускает один пробный вызов
+    (half_open): успех замыкает автомат, неудача снова размыкает.
+    Заодно хранит задержки успешных вызовов для порога хеджирования (p95).
+    """
+
+    def __init__(self, window=20, min_calls=5, error_rate=0.5, slow_call_s=20.0, cooldown=30.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.failures: deque[bool] = deque(maxlen=window)
+        self.latencies: deque[float] = deque(maxlen=100)
+        self._probe = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+            self._probe = False
+        if self.state == "half_open":
+            if self._probe:
+                return False
+            self._probe = True
+        return True
+
+    def record(self, ok: bool, latency: float):
+        failure = not ok or latency >= self.slow_call_s
+        if ok:
+            self.latencies.append(latency)
+        if self.state == "half_open":
+            self._probe = False
+            if failure:
+                self._open()
+            else:
+                self.state = "closed"
+                self.failures.clear()
+            return
+        self.failures.append(failure)
+        if len(self.failures) >= self.min_calls and sum(self.failures) / len(self.failures) >= self.error_rate:
+            self._open()
+
+    def release(self):
+        """Вызов отменён без результата — освобождаем пробный слот."""
+        self._probe = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.failures.clear()
+
+    def hedge_delay(self, floor=1.0):
+        """Через сколько секунд запускать дублирующий запрос (p95 успешных), None — мало данных."""
+        if len(self.latencies) < self.min_calls:
+            return None
+        ordered = sorted(self.latencies)
+        return max(floor, ordered[int(0.95 * (len(ordered) - 1))])
@@ -0,0 +1,170 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+MEAL_CACHE_FILE = Path("data/meal_cache.sqlite3")
+# Размер слоя в памяти (записей)
+MEMORY_CACHE_SIZE = 2048
+# Дисковый слой: срок жизни записи и максимум записей (лишние вытесняются по давности обращения)
+DISK_CACHE_TTL = 30 * 24 * 3600
+DISK_CACHE_MAX_ENTRIES = 50_000
+
+# Единицы измерения к одному написанию
+UNIT_ALIASES = {
+    "гр": "г", "грамм": "г", "грамма": "г", "граммов": "г", "g": "г",
+    "кг": "кг", "килограмм": "кг",
+    "мл": "мл", "ml": "мл", "л": "л", "литр": "л",
+    "шт": "шт", "штук": "шт", "штуки": "шт", "штука": "шт",
+    "ст.л": "стл", "ст": "стл", "столовая": "стл", "столовых": "стл",
+    "ч.л": "чл", "чайная": "чл", "чайных": "чл",
+}
+
+
+def normalize_meal_text(text: str) -> str:
+    """
+    Ключ кэша: регистр, ё/е, десятичная запятая, пробелы, пунктуация и написание единиц
+    не влияют на результат; порядок продуктов, перечисленных через , ; + или "и", тоже.
+    "Овсянка с молоком, банан 1,5 шт." и "банан 1.5шт;  овсянка с молоком" дают один ключ
+    (без разделителя — "банан 1.5шт овсянка с молоком" — это один продукт и другой ключ).
+    """
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)                 # 1,5 -> 1.5
+    text = re.sub(r"(\d)\s*(?=[^\d\s.,;])", r"\1 ", text)      # 10г -> 10 г
+    text = re.sub(r"\b(ст|ч)\.\s*л\b", r"\1.л", text)           # ст. л -> ст.л
+    items = []
+    for item in re.split(r"[,;+\n]|\s+и\s+", text):
+        words = []
+        for word in re.findall(r"\d+(?:\.\d+)?|[a-zа-я]+(?:\.л)?", item):
+            if re.fullmatch(r"\d+(?:\.\d+)?", word):
+                word = f"{float(word):g}"                         # 2.0 -> 2, 010 -> 10
+            words.append(UNIT_ALIASES.get(word, word))
+        if words:
+            items.append(" ".join(words))
+    return " | ".join(sorted(items))
+
+
+class MealCache:
+    """
+    Двухуровневый кэш разобранных приёмов пищи: нормализованный текст -> БЖУ/калории.
+    Первый уровень — LRU в памяти, второй — таблица SQLite с TTL и ограничением размера.
+    Счётчики попаданий/промахов и сэкономленного времени модели — в stats().
+    """
+
+    def __init__(self, db_file=MEAL_CACHE_FILE, memory_size=MEMORY_CACHE_SIZE,
+                 ttl=DISK_CACHE_TTL, max_entries=DISK_CACHE_MAX_ENTRIES):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS meal_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_meal_cache_accessed ON meal_cache(accessed_at)")
+            self._disk_count = self.conn.execute("SELECT COUNT(*) FROM meal_cache").fetchone()[0]
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        self._miss_seconds = 0.0
+
+    def get(self, text: str):
+        """Результат из кэша (копия dict) или None."""
+        cached = self.get_memory(text)
+        return cached if cached is not None else self.get_disk(text)
+
+    def get_memory(self, text: str):
+        """Только слой в памяти, без обращения к SQLite — можно вызывать прямо в цикле событий."""
+        key = normalize_meal_text(text)
+        with self.lock:
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return dict(entry[1])
+            return None
+
+    def get_disk(self, text: str):
+        """Дисковый слой (SQLite); найденное поднимается в память. Вызывать через asyncio.to_thread."""
+        key = normalize_meal_text(text)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at FROM meal_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                value = json.loads(row[0])
+                self.conn.execute("UPDATE meal_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._remember(key, row[1], value)
+                self.counters["disk_hits"] += 1
+                return dict(value)
+
+            self._memory.pop(key, None)
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, text: str, value: dict, elapsed: float = 0.0):
+        """Сохраняет результат модели; elapsed — время запроса к модели (для оценки экономии)."""
+        key = normalize_meal_text(text)
+        if not key:
+            return
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, value)
+            self._miss_seconds += elapsed
+            self.counters["stores"] += 1
+            existed = self.conn.execute("SELECT 1 FROM meal_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meal_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            if not existed:
+                self._disk_count += 1
+            if self._disk_count > self.max_entries:
+                self._evict(now)
+
+    def _remember(self, key: str, created_at: float, value: dict):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        """Удаляет просроченные записи, затем давно не читанные — до 90% лимита."""
+        self.conn.execute("DELETE FROM meal_cache WHERE created_at < ?", (now - self.ttl,))
+        keep = int(self.max_entries * 0.9)
+        self.conn.execute(
+            "DELETE FROM meal_cache WHERE key IN ("
+            "SELECT key FROM meal_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (keep,),
+        )
+        self._disk_count = self.conn.execute("SELECT COUNT(*) FROM meal_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            avg_miss = self._miss_seconds / self.counters["stores"] if self.counters["stores"] else 0.0
+            return {
+                **self.counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "avg_llm_seconds": avg_miss,
+                "saved_llm_seconds": hits * avg_miss,
+            }
+
+
+_meal_cache = None
+
+
+def get_meal_cache() -> MealCache:
+    """Общий для процесса кэш (создаётся при первом обращении)."""
+    global _meal_cache
+    if _meal_cache is None:
+        _meal_cache = MealCache()
+    return _meal_cache
@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from app.services.csv_client import MACROS, safe_float
+from app.services.meal_cache import normalize_meal_text
+from app.services.nutrition_db import NUMBER_WORDS, UNITS
+
+MEAL_INDEX_FILE = Path("data/meal_index.jsonl")
+# Похожесть (косинус), начиная с которой макросы берутся из индекса без запроса к модели
+# (только если количества в текстах совпадают — см. same_quantities)
+REUSE_THRESHOLD = 0.92
+# Соседи с похожестью не ниже этой идут в промпт как примеры
+CONTEXT_THRESHOLD = 0.35
+FEW_SHOT = 3
+# Как часто сбрасывать на диск кэш векторов (число добавлений)
+SAVE_EVERY = 50
+
+
+# --- Эмбеддеры ---
+class HashingEmbedder:
+    """
+    Офлайн-эмбеддинг без модели: символьные n-граммы и слова нормализованного текста
+    хешируются (crc32) в вектор фиксированной длины со знаком, затем L2-нормировка.
+    """
+
+    def __init__(self, dim=512, ngrams=(3, 4)):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.name = f"hashing{dim}"
+
+    def _features(self, text: str):
+        text = normalize_meal_text(text)
+        padded = f" {text} "
+        for n in self.ngrams:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+        yield from (f"w:{w}" for w in text.split())
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class LangChainEmbedder:
+    """Адаптер для любого langchain Embeddings (например, OpenAIEmbeddings)."""
+
+    def __init__(self, embeddings, name: str):
+        self.embeddings = embeddings
+        self.name = name
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+def create_embedder(kind: str):
+    """hashing (по умолчанию, офлайн) или openai (text-embedding-3-small через langchain_openai)."""
+    if kind == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return LangChainEmbedder(OpenAIEmbeddings(model="text-embedding-3-small"), "openai-3-small")
+    return HashingEmbedder()
+
+
+# --- Индекс ---
+class MealVectorIndex:
+    """
+    Индекс ранее разобранных приёмов: текст + итоговые макросы, поиск ближайших
+    полным перебором (матрица векторов @ запрос в NumPy).
+
+    Записи хранятся в JSON Lines (источник правды), векторы — в кэше .npy рядом
+    (свой файл на эмбеддер): при загрузке досчитываются только недостающие строки.
+    """
+
+    def __init__(self, embedder, index_file=MEAL_INDEX_FILE):
+        self.embedder = embedder
+        self.index_file = Path(index_file)
+        self.vectors_file = self.index_file.with_suffix(f".{embedder.name}.npy")
+        self.lock = threading.RLock()
+        self.texts: list[str] = []
+        self.macros = np.empty((0, len(MACROS)), dtype=np.float32)
+        self._vectors = None
+        self._size = 0
+        self._unsaved = 0
+        self._load()
+
+    def _load(self):
+        records = []
+        if self.index_file.exists():
+            with open(self.index_file, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        self.texts = [r["text"] for r in records]
+        self.macros = np.array([[safe_float(r.get(k)) for k in MACROS] for r in records],
+                               dtype=np.float32).reshape(-1, len(MACROS))
+        vectors = None
+        if self.vectors_file.exists():
+            vectors = np.load(self.vectors_file)[:len(records)]
+        if vectors is None or not len(vectors):
+            vectors = self.embedder.embed(self.texts) if records else None
+        elif len(vectors) < len(records):
+            vectors = np.vstack([vectors, self.embedder.embed(self.texts[len(vectors):])])
+        self._size = len(records)
+        if vectors is not None:
+            self._vectors = np.array(vectors, dtype=np.float32)
+            if len(records) and not self.vectors_file.exists():
+                self.save()
+
+    def __len__(self):
+        return self._size
+
+    def save(self):
+        with self.lock:
+            if self._vectors is None:
+                return
+            tmp = self.vectors_file.with_suffix(".tmp.npy")
+            np.save(tmp, self._vectors[:self._size])
+            os.replace(tmp, self.vectors_file)
+            self._unsaved = 0
+
+    def add(self, text: str, macros: dict):
+        """Добавляет разобранный приём (точные повторы с теми же макросами не дублируются)."""
+        values = np.array([safe_float(macros.get(k)) for k in MACROS], dtype=np.float32)
+        vector = self.embedder.embed([text])[0]
+        with self.lock:
+            if self._size:
+                scores = self._vectors[:self._size] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] > 0.999 and np.allclose(self.macros[best], values):
+                    return
+            if self._vectors is None:
+                self._vectors = np.empty((16, len(vector)), dtype=np.float32)
+            elif self._size == len(self._vectors):
+                self._vectors = np.vstack([self._vectors, np.empty_like(self._vectors)])
+            self._vectors[self._size] = vector
+            self.macros = np.vstack([self.macros, values[None, :]])
+            self.texts.append(text)
+            self._size += 1
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"text": text, **dict(zip(MACROS, values.tolist()))}, ensure_ascii=False) + "\n")
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self.save()
+
+    def search(self, text: str, k=FEW_SHOT) -> list[tuple[float, str, dict]]:
+        """k ближайших: [(похожесть, текст, макросы)], по убыванию похожести."""
+        with self.lock:
+            if not self._size:
+                return []
+            query = self.embedder.embed([text])[0]
+            scores = self._vectors[:self._size] @ query
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), self.texts[i], dict(zip(MACROS, self.macros[i].tolist()))) for i in top]
+
+
+def quantities(text: str) -> list[tuple[float, str]]:
+    """
+    Количества в тексте приёма: [(число, единица)], по возрастанию. Граммы/мл приводятся
+    к одной шкале ("0.2 кг" = "200 г"), штуки/куски/ломтики — к "шт"; единица без числа — 1.
+    """
+    words = normalize_meal_text(text).split()
+    result = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        number = NUMBER_WORDS.get(word)
+        if number is None and word.replace(".", "", 1).isdigit():
+            number = float(word)
+        unit_word = words[i + 1] if number is not None and i + 1 < len(words) else word
+        if unit_word in UNITS:
+            unit = UNITS[unit_word]
+            scale = unit if isinstance(unit, (int, float)) else 1
+            result.append(((number or 1) * scale, "г" if isinstance(unit, (int, float)) else unit or "шт"))
+            i += 2 if number is not None else 1
+            continue
+        if number is not None:
+            result.append((number, ""))
+        i += 1
+    return sorted(result)
+
+
+def same_quantities(text: str, other: str) -> bool:
+    """Похожий текст можно переиспользовать, только если все количества и единицы совпадают."""
+    return quantities(text) == quantities(other)
+
+
+def few_shot_context(neighbours: list[tuple[float, str, dict]], threshold=CONTEXT_THRESHOLD) -> str:
+    """Компактные примеры для промпта из соседей не ниже порога."""
+    lines = [
+        f'- "{text}": {m["calories"]:.0f} ккал, Б {m["protein"]:.0f} / Ж {m["fat"]:.0f} / У {m["carbs"]:.0f}'
+        for score, text, m in neighbours if score >= threshold
+    ]
+    return "\n".join(lines)
+
+
+_meal_index = None
+
+
+def get_meal_index() -> MealVectorIndex:
+    """Общий для процесса индекс (эмбеддер — MEAL_INDEX_EMBEDDER из конфига)."""
+    global _meal_index
+    if _meal_index is None:
+        from app.config import MEAL_INDEX_EMBEDDER
+        _meal_index = MealVectorIndex(create_embedder(MEAL_INDEX_EMBEDDER))
+    return _meal_index
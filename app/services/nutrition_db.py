@@ -0,0 +1,239 @@
+import re
+
+# --- Таблица продуктов ---
+# name, шаблоны (кортежи основ слов), на 100 г: калории, белки, жиры, углеводы,
+# вес одной штуки/ломтика (г, None — не штучный), вес порции по умолчанию (г)
+FOODS = [
+    ("яйцо", [("яйц",), ("яиц",)], 157, 12.7, 10.9, 0.7, 50, 50),
+    ("помидор", [("помидор",), ("томат",)], 20, 0.6, 0.2, 4.2, 120, 120),
+    ("огурец", [("огур",), ("огурц",)], 15, 0.8, 0.1, 2.8, 100, 100),
+    ("масло растительное", [("масл",), ("масл", "растительн"), ("масл", "подсолнечн")], 899, 0, 99.9, 0, None, 10),
+    ("масло оливковое", [("масл", "оливков")], 898, 0, 99.8, 0, None, 10),
+    ("масло сливочное", [("масл", "сливочн")], 748, 0.5, 82.5, 0.8, None, 10),
+    ("хлеб белый", [("хлеб",), ("хлеб", "бел")], 265, 8.1, 3.2, 48.8, 30, 30),
+    ("хлеб ржаной", [("хлеб", "ржан"), ("хлеб", "черн"), ("бородинск",)], 210, 6.6, 1.2, 42.7, 30, 30),
+    ("батон", [("батон",)], 262, 7.5, 2.9, 51.4, 30, 30),
+    ("хлебцы", [("хлебц",)], 300, 10, 3, 57, 10, 20),
+    ("гречка варёная", [("греч",), ("гречнев",), ("гречнев", "каш")], 110, 4.2, 1.1, 21.3, None, 200),
+    ("рис варёный", [("рис",)], 116, 2.2, 0.5, 24.9, None, 180),
+    ("овсяная каша", [("овсян",), ("овсян", "каш")], 88, 3, 1.7, 15, None, 250),
+    ("овсяные хлопья", [("овсян", "хлоп"), ("геркулес",)], 352, 12.3, 6.2, 61.8, None, 40),
+    ("макароны варёные", [("макарон",), ("спагетти",)], 112, 3.5, 0.4, 23.2, None, 200),
+    ("картофель варёный", [("картоф",), ("картошк",)], 82, 2, 0.4, 16.7, 100, 200),
+    ("картофельное пюре", [("пюре",), ("картофельн", "пюре")], 106, 2.5, 4.2, 14.7, None, 200),
+    ("куриная грудка", [("грудк",), ("курин", "грудк"), ("курин", "филе"), ("филе",)], 165, 31, 3.6, 0, None, 150),
+    ("курица", [("куриц",)], 190, 19, 12, 0, None, 150),
+    ("говядина", [("говядин",)], 254, 25.8, 16.8, 0, None, 150),
+    ("свинина", [("свинин",)], 242, 27, 14, 0, None, 150),
+    ("индейка", [("индейк",)], 147, 30, 2, 0, None, 150),
+    ("лосось", [("лосос",), ("семг",), ("форел",)], 208, 20, 13, 0, None, 150),
+    ("тунец консервированный", [("тунец",), ("тунц",)], 116, 26, 1, 0, None, 100),
+    ("треска", [("треск",)], 78, 17.7, 0.7, 0, None, 150),
+    ("креветки", [("кревет",)], 99, 24, 0.3, 0.2, None, 100),
+    ("творог 5%", [("творог",)], 121, 17.2, 5, 1.8, None, 200),
+    ("молоко 2,5%", [("молок",)], 52, 2.8, 2.5, 4.7, None, 200),
+    ("кефир 2,5%", [("кефир",)], 53, 2.9, 2.5, 4, None, 250),
+    ("йогурт натуральный", [("йогурт",)], 66, 5, 3.2, 3.5, None, 150),
+    ("сметана 15%", [("сметан",)], 162, 2.6, 15, 3, None, 20),
+    ("сыр твёрдый", [("сыр",)], 363, 23, 30, 0, 20, 30),
+    ("колбаса варёная", [("колбас",)], 257, 12, 22.8, 1.8, 20, 50),
+    ("сосиска", [("сосиск",)], 266, 11, 24, 1.6, 50, 50),
+    ("ветчина", [("ветчин",)], 145, 21, 6, 1, 20, 40),
+    ("банан", [("банан",)], 96, 1.5, 0.2, 21.8, 120, 120),
+    ("яблоко", [("яблок",)], 47, 0.4, 0.4, 9.8, 150, 150),
+    ("апельсин", [("апельсин",)], 43, 0.9, 0.2, 8.1, 150, 150),
+    ("мандарин", [("мандарин",)], 38, 0.8, 0.2, 7.5, 70, 70),
+    ("груша", [("груш",)], 47, 0.4, 0.3, 10.3, 150, 150),
+    ("киви", [("киви",)], 47, 0.8, 0.4, 8.1, 75, 75),
+    ("виноград", [("виноград",)], 72, 0.6, 0.6, 15.4, None, 100),
+    ("клубника", [("клубник",)], 41, 0.8, 0.4, 7.5, None, 100),
+    ("черника", [("черник",)], 44, 1.1, 0.4, 7.6, None, 100),
+    ("авокадо", [("авокадо",)], 160, 2, 14.7, 1.8, 150, 150),
+    ("морковь", [("морков",), ("морковк",)], 35, 1.3, 0.1, 6.9, 80, 80),
+    ("капуста", [("капуст",)], 27, 1.8, 0.1, 4.7, None, 100),
+    ("брокколи", [("брокколи",)], 34, 2.8, 0.4, 6.6, None, 100),
+    ("перец болгарский", [("перец",), ("перц",), ("перец", "болгарск"), ("перц", "болгарск")], 27, 1.3, 0, 5.3, 150, 150),
+    ("лук", [("лук",)], 41, 1.4, 0, 10.4, 80, 40),
+    ("грецкие орехи", [("грецк",), ("орех", "грецк")], 654, 15.2, 65.2, 7, None, 30),
+    ("орехи", [("орех",), ("орешк",)], 607, 20, 54, 13, None, 30),
+    ("миндаль", [("миндал",)], 609, 18.6, 53.7, 13, None, 30),
+    ("арахис", [("арахис",)], 551, 26.3, 45.2, 9.9, None, 30),
+    ("шоколад", [("шоколад",)], 539, 6.2, 35.4, 48.2, 5, 25),
+    ("сахар", [("сахар",)], 399, 0, 0, 99.8, None, 5),
+    ("мёд", [("мед",)], 329, 0.8, 0, 81.5, None, 20),
+    ("кофе чёрный", [("кофе",)], 2, 0.2, 0, 0.3, None, 200),
+    ("чай", [("чай",), ("чая",), ("чаю",)], 1, 0, 0, 0.3, None, 250),
+    ("сок", [("сок",)], 45, 0.7, 0.2, 10.4, None, 200),
+    ("пельмени", [("пельмен",)], 275, 11.9, 12.4, 29, 12, 200),
+    ("сырники", [("сырник",)], 220, 15, 10, 17, 50, 150),
+    ("блины", [("блин",), ("блинчик",)], 233, 6.1, 12.3, 26, 40, 120),
+    ("протеин", [("протеин",)], 380, 75, 5, 8, None, 30),
+]
+
+# Единицы: вес в граммах; None — "штука" (берётся вес штуки продукта)
+UNITS = {
+    "г": 1, "гр": 1, "грамм": 1, "грамма": 1, "граммов": 1,
+    "кг": 1000, "мл": 1, "л": 1000,
+    "шт": None, "штук": None, "штуки": None, "штука": None, "штучки": None,
+    "ломтик": None, "ломтика": None, "ломтиков": None, "кусок": None, "куска": None, "кусочек": None, "кусочка": None,
+    "стакан": 250, "стакана": 250, "чашка": 250, "чашки": 250, "кружка": 300, "кружки": 300,
+    "стл": 15, "чл": 5, "ложка": 15, "ложки": 15, "горсть": 30, "горсти": 30,
+    "порция": "portion", "порции": "portion", "порций": "portion", "тарелка": "portion", "тарелки": "portion",
+}
+
+NUMBER_WORDS = {
+    "один": 1, "одна": 1, "одно": 1, "одну": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5,
+    "пол": 0.5, "половина": 0.5, "половинка": 0.5, "половину": 0.5, "полтора": 1.5, "полторы": 1.5,
+}
+
+# Слова, которые не меняют продукт (множитель веса порции/штуки)
+MODIFIERS = {"свеж": 1, "варен": 1, "отварн": 1, "натуральн": 1, "обычн": 1, "целы": 1, "средн": 1,
+             "больш": 1.3, "крупн": 1.3, "маленьк": 0.7, "небольш": 0.7, "мелк": 0.7}
+
+# Длина окончания после основы: "яйца" = "яйц" + "а", но "сырники" ≠ "сыр" + "ники"
+MAX_ENDING = 3
+# Короткие основы ("сыр", "лук", "рис", "мед", "сок", "чай", "яйц") — только с падежными окончаниями:
+# иначе "сырок" становится сыром, а "лукум" — луком
+SHORT_STEM = 3
+NOUN_ENDINGS = {"", "а", "я", "у", "ю", "о", "е", "ы", "и", "ом", "ем", "ов", "ев", "ам", "ям", "ами", "ями", "ах", "ях"}
+LOCAL_CONFIDENCE = 0.9
+# Число без единицы: от 20 — граммы, до MAX_BARE_PIECES — штуки (если у продукта есть вес штуки),
+# между ними — неоднозначно, разбор отдаётся модели
+MAX_BARE_PIECES = 10
+
+# Шаблоны продуктов по первым двум буквам первой основы — чтобы не перебирать всю таблицу
+_PATTERNS_BY_PREFIX: dict[str, list[tuple]] = {}
+for _food in FOODS:
+    for _pattern in _food[1]:
+        _PATTERNS_BY_PREFIX.setdefault(_pattern[0][:2], []).append((_food, _pattern))
+
+
+def _stem_match(token: str, stem: str) -> bool:
+    if not token.startswith(stem):
+        return False
+    if len(stem) <= SHORT_STEM:
+        return token[len(stem):] in NOUN_ENDINGS
+    return len(token) - len(stem) <= MAX_ENDING
+
+
+def _match_food(words: list[str]):
+    """
+    Подбирает продукт, чьи основы покрывают слова; при нескольких вариантах — более длинное совпадение.
+    Возвращает (продукт, множитель, непокрытые слова) или None.
+    """
+    best = None
+    candidates = [c for prefix in {w[:2] for w in words} for c in _PATTERNS_BY_PREFIX.get(prefix, ())]
+    for food, pattern in candidates:
+        used = set()
+        for stem in pattern:
+            i = next((i for i, w in enumerate(words) if i not in used and _stem_match(w, stem)), None)
+            if i is None:
+                break
+            used.add(i)
+        else:
+            score = (len(used), sum(map(len, pattern)))
+            if best is None or score > best[0]:
+                best = (score, food, used)
+    if best is None:
+        return None
+    _, food, used = best
+    factor = 1.0
+    rest = []
+    for i, word in enumerate(words):
+        if i in used:
+            continue
+        modifier = next((m for stem, m in MODIFIERS.items() if word.startswith(stem)), None)
+        if modifier is None:
+            rest.append(word)
+        else:
+            factor *= modifier
+    return food, factor, rest
+
+
+def _tokenize(item: str) -> list[str]:
+    item = re.sub(r"(\d)\s*(?=[^\d\s.])", r"\1 ", item)
+    item = re.sub(r"\b(ст|ч)\.?\s*л\.?", lambda m: f" {m.group(1)}л ", item)
+    return re.findall(r"\d+(?:\.\d+)?|[a-zа-я]+", item)
+
+
+def _parse_item(item: str):
+    """Один продукт: "2 яйца", "10 г масла", "помидор". Возвращает описание с граммами или None."""
+    quantity = None
+    unit = False  # False — единица не указана
+    words = []
+    for token in _tokenize(item):
+        if re.fullmatch(r"\d+(?:\.\d+)?", token) or token in NUMBER_WORDS:
+            if quantity is not None:
+                return None
+            quantity = float(token) if token[0].isdigit() else NUMBER_WORDS[token]
+        elif token in UNITS and unit is False:
+            unit = UNITS[token]
+        else:
+            words.append(token)
+    if not words:
+        return None
+    matched = _match_food(words)
+    if matched is None or matched[2]:
+        return None
+    food, factor, _ = matched
+    name, _, kcal, protein, fat, carbs, piece, portion = food
+
+    if unit is False:
+        if quantity is None:
+            grams = portion
+        elif quantity >= 20:
+            grams = quantity  # "гречка 200", "банан 120" — граммы
+        elif piece is not None and quantity <= MAX_BARE_PIECES:
+            grams = quantity * piece  # "банан 2" — штуки
+        else:
+            return None  # "сыр 15": штуки или граммы — решает модель
+    elif unit is None:
+        if piece is None:
+            return None
+        grams = (quantity or 1) * piece
+    elif unit == "portion":
+        grams = (quantity or 1) * portion
+    else:
+        grams = (quantity or 1) * unit
+    grams *= factor
+
+    k = grams / 100
+    return {"food": name, "grams": round(grams), "calories": kcal * k,
+            "protein": protein * k, "fat": fat * k, "carbs": carbs * k}
+
+
+def parse_meal_locally(text: str, partial: bool = False):
+    """
+    Разбирает перечисление продуктов по локальной таблице ("2 яйца, помидор, 10 г масла").
+    Возвращает dict в формате parse_meal_text или None, если хоть один продукт не распознан
+    (составные блюда вроде "гречка с курицей" уходят в модель).
+    partial=True — грубая оценка по распознанным продуктам (когда модель недоступна);
+    нераспознанные перечислены в details["unrecognized"], None — если не распознано ничего.
+    """
+    text = text.lower().replace("ё", "е").replace("-", " ")
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)  # десятичная запятая — не разделитель продуктов
+    items = [i for i in re.split(r"[,;+\n]|\s+и\s+", text) if i.strip()]
+    if not items:
+        return None
+    parsed = []
+    unrecognized = []
+    for item in items:
+        result = _parse_item(item)
+        if result is None:
+            if not partial:
+                return None
+            unrecognized.append(item.strip())
+            continue
+        parsed.append(result)
+    if not parsed:
+        return None
+
+    totals = {k: round(sum(p[k] for p in parsed), 1) for k in ("protein", "fat", "carbs", "calories")}
+    details = {
+        "source": "local_db",
+        "confidence": round(LOCAL_CONFIDENCE * len(parsed) / len(items), 2),
+        "items": [f"{p['food']} {p['grams']} г" for p in parsed],
+    }
+    if unrecognized:
+        details["unrecognized"] = unrecognized
+    return {**totals, "details": details}
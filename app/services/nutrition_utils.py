@@ -0,0 +1,270 @@
+import re
+
+# --- Расчёт нормы: Mifflin–St Jeor ---
+# Коэффициенты активности к базовому обмену
+ACTIVITY_MULTIPLIERS = {
+    "сидячая": 1.2,
+    "низкая": 1.375,
+    "умеренная": 1.55,
+    "высокая": 1.725,
+    "очень высокая": 1.9,
+}
+# Дефицит / профицит калорий от TDEE по цели
+GOAL_ADJUSTMENT = {"похудение": -0.15, "поддержание": 0.0, "набор": 0.10}
+# Белок (г на кг веса) по цели; доля калорий из жиров; нижняя граница нормы по полу
+PROTEIN_PER_KG = {"похудение": 1.8, "поддержание": 1.5, "набор": 1.8}
+FAT_SHARE = 0.27
+MIN_CALORIES = {"м": 1500, "ж": 1200}
+
+LIMITS = {"age": (10, 100), "height": (120, 230), "weight": (30, 300), "horizon_weeks": (1, 260)}
+# Правдоподобный ИМТ для пары рост/вес; вне диапазона — скорее ошибка разбора, переспрашиваем
+BMI_LIMITS = (12, 70)
+# Единицы роста/веса, которые не пересчитываем: ответ уходит на уточнение, а не угадывается
+UNSUPPORTED_UNITS = r"центнер\w*|тонн\w*|фунт\w*|lbs?|pounds?|стоун\w*|st|дюйм\w*|inch\w*|in|фут\w*|ft|мм|mm|дм|г|гр|грамм\w*"
+# Числа словами в ответах про срок ("два месяца", "пару недель")
+COUNT_WORDS = {"один": 1, "одну": 1, "пару": 2, "пара": 2, "два": 2, "две": 2, "три": 3,
+               "четыре": 4, "пять": 5, "шесть": 6, "полтора": 1.5, "полторы": 1.5}
+
+
+def bmr(sex: str, weight: float, height: float, age: float) -> float:
+    """Базовый обмен (ккал): 10·вес + 6.25·рост − 5·возраст + 5 (м) / − 161 (ж)."""
+    return 10 * weight + 6.25 * height - 5 * age + (5 if sex == "м" else -161)
+
+
+def tdee(bmr_value: float, activity: str) -> float:
+    """Суточный расход с учётом активности."""
+    return bmr_value * ACTIVITY_MULTIPLIERS[activity]
+
+
+def calculate_targets(age, sex, height, weight, activity, goal) -> dict:
+    """
+    Норма калорий и БЖУ: TDEE ± поправка по цели (не ниже минимума по полу),
+    белок по весу, жиры — FAT_SHARE калорий, углеводы — остаток.
+    """
+    target = tdee(bmr(sex, weight, height, age), activity) * (1 + GOAL_ADJUSTMENT[goal])
+    target = round(max(target, MIN_CALORIES[sex]) / 10) * 10
+    protein = round(PROTEIN_PER_KG[goal] * weight)
+    fat = round(target * FAT_SHARE / 9)
+    carbs = max(0, round((target - protein * 4 - fat * 9) / 4))
+    return {"target_cal": target, "p_goal": protein, "f_goal": fat, "c_goal": carbs}
+
+
+def build_profile(fields: dict) -> dict:
+    """Профиль для сохранения: поля анкеты + рассчитанная норма."""
+    profile = {k: fields[k] for k in ("age", "sex", "height", "weight", "activity", "goal")}
+    for k in ("height", "weight"):
+        if float(profile[k]).is_integer():
+            profile[k] = int(profile[k])
+    profile.update(calculate_targets(**profile))
+    return profile
+
+
+# --- Разбор ответов анкеты ---
+def _numbers(text: str) -> list[float]:
+    return [float(n) for n in re.findall(r"\d+(?:\.\d+)?", text.replace(",", "."))]
+
+
+def _in_limits(key: str, value):
+    low, high = LIMITS[key]
+    return value if value is not None and low <= value <= high else None
+
+
+def parse_age(text: str):
+    numbers = _numbers(text or "")
+    return _in_limits("age", int(numbers[0])) if numbers else None
+
+
+def parse_sex(text: str):
+    text = (text or "").lower().strip()
+    if re.search(r"\b(ж|жен\w*|девушк\w*|девочк\w*|female|f)\b", text):
+        return "ж"
+    if re.search(r"\b(м|муж\w*|парен\w*|мальчик\w*|male|m)\b", text):
+        return "м"
+    return None
+
+
+def parse_height_weight(text: str):
+    """
+    Рост (см) и вес (кг) из одного ответа: "180 и 75", "рост 1.8 м, вес 75кг", "75 кг 180 см".
+    Незнакомые единицы ("2 центнера", "160 фунтов"), смешанная запись ("1м 80")
+    и неправдоподобная пара (по ИМТ) — (None, None): такой ответ уточняется, а не угадывается.
+    """
+    text = (text or "").lower().replace(",", ".")
+    if re.search(r"(?<![\d.])\d+\s*(м|m|метр\w*)\s*\d", text):
+        return None, None
+    height = weight = None
+    unlabeled = []
+    for number, unit in re.findall(r"(\d+(?:\.\d+)?)\s*([a-zа-я]+)?", text):
+        value = float(number)
+        if unit in ("кг", "kg", "килограмм", "килограмма", "килограммов", "кило"):
+            weight = value
+        elif unit in ("см", "cm", "сантиметров", "сантиметра"):
+            height = value
+        elif unit in ("м", "m", "метр", "метра"):
+            height = value * 100
+        elif unit and re.fullmatch(UNSUPPORTED_UNITS, unit):
+            return None, None
+        elif 1.2 <= value <= 2.3 and not value.is_integer():
+            height = value * 100  # "1.75" — метры; целое "2" ростом не считаем
+        else:
+            unlabeled.append(value)
+    # числа без единиц: рост — то, что больше и похоже на сантиметры
+    for value in sorted(unlabeled, reverse=True):
+        if height is None and LIMITS["height"][0] <= value <= LIMITS["height"][1]:
+            height = value
+        elif weight is None:
+            weight = value
+    return _plausible(_in_limits("height", height), _in_limits("weight", weight))
+
+
+def _plausible(height, weight):
+    """Пара рост/вес с ИМТ вне BMI_LIMITS — ошибка разбора: (None, None)."""
+    if height and weight and not BMI_LIMITS[0] <= weight / (height / 100) ** 2 <= BMI_LIMITS[1]:
+        return None, None
+    return height, weight
+
+
+ACTIVITY_KEYWORDS = [
+    ("очень высокая", r"очень высок|профессиональн|дважды в день|2 раза в день|спортсмен"),
+    ("сидячая", r"сидяч|офис|малоподвиж|не занима|почти не|никак|не хожу"),
+    ("высокая", r"высок|каждый день|ежедневн|тяжел\w* (физическ|работ)|физическ\w* работ|на ногах"),
+    ("умеренная", r"умерен|средн|регулярн|несколько раз"),
+    ("низкая", r"низк|легк|лёгк|иногда|редко|прогулк|ходьб|гуля"),
+]
+
+
+def parse_activity(text: str):
+    """
+    Уровень активности: ключевые слова или число тренировок в неделю ("3-4 раза").
+    Отрицание ("не высокая") и слова разных уровней ("почти каждый день гуляю") — None.
+    """
+    text = (text or "").lower()
+    for label in ACTIVITY_MULTIPLIERS:
+        if text.strip() == label:
+            return label
+    # голое "нет" — не занимаюсь; "нет, 70 кг" — ответ не на этот вопрос, уточняем
+    if re.fullmatch(r"\s*(нет|неа|не-а)[\s.!]*", text):
+        return "сидячая"
+    times = re.search(r"(\d+)(?:\s*-\s*(\d+))?\s*раз", text)
+    if times and "в день" not in text[times.end():times.end() + 8]:
+        per_week = int(times.group(2) or times.group(1))
+        if per_week == 0:
+            return "сидячая"
+        if per_week <= 2:
+            return "низкая"
+        if per_week <= 4:
+            return "умеренная"
+        return "высокая" if per_week <= 6 else "очень высокая"
+    labels = set()
+    for label, pattern in ACTIVITY_KEYWORDS:
+        for match in re.finditer(pattern, text):
+            if re.search(r"\bне\s+$", text[:match.start()]):
+                return None
+            labels.add(label)
+        # совпавшее вырезаем, чтобы "очень высокая" не засчиталась ещё и как "высокая"
+        text = re.sub(pattern, " ", text)
+    return labels.pop() if len(labels) == 1 else None
+
+
+GOAL_KEYWORDS = [
+    ("поддержание", r"поддерж|сохран|удерж|остаться|не менять"),
+    ("похудение", r"похуд|худе|сброс|скину|снизи|сниже|минус|сушк|убрать|жир"),
+    ("набор", r"набор|набра|масс|поправ|плюс|увелич|мышц"),
+]
+
+
+def parse_goal(text: str, weight: float = None):
+    """
+    Цель: по словам ("похудеть", "набрать массу") или по желаемому весу относительно текущего.
+    Ответ, подходящий под несколько целей ("похудеть и сохранить мышцы", "набрать массу без жира"),
+    или слова, расходящиеся с желаемым весом, — None: решает модель или уточняющий вопрос.
+    """
+    text = (text or "").lower()
+    goals = {goal for goal, pattern in GOAL_KEYWORDS if re.search(pattern, text)}
+    by_weight = None
+    numbers = [n for n in _numbers(text) if LIMITS["weight"][0] <= n <= LIMITS["weight"][1]]
+    if numbers and weight:
+        if numbers[0] < weight - 1:
+            by_weight = "похудение"
+        elif numbers[0] > weight + 1:
+            by_weight = "набор"
+        else:
+            by_weight = "поддержание"
+    if by_weight:
+        goals.add(by_weight)
+    return goals.pop() if len(goals) == 1 else None
+
+
+def parse_horizon(text: str):
+    """
+    Срок до результата в неделях: "3 месяца", "полгода", "8 недель", "год", "два месяца".
+    Дата вместо срока ("к лету", "до нового года") и срок вне LIMITS — None (уточняем).
+    """
+    text = (text or "").lower()
+    if re.search(r"\bпол\s*год", text):
+        return 26
+    numbers = _numbers(text)
+    words = [COUNT_WORDS[w] for w in re.findall(r"[а-я]+", text) if w in COUNT_WORDS]
+    count = numbers[0] if numbers else words[0] if words else None
+    if count is None and re.search(r"\b(к|ко|до)\s", text):
+        return None
+    for pattern, weeks in ((r"\bнедел", 1), (r"\bмесяц|\bмес\b", 4.3), (r"\bгод|\bлет\b", 52), (r"\bдн|\bдень|\bдня", 1 / 7)):
+        if re.search(pattern, text):
+            return _in_limits("horizon_weeks", max(1, round((count or 1) * weeks)))
+    return None
+
+
+# Какие поля профиля даёт каждый вопрос регистрации (по порядку вопросов)
+QUESTION_FIELDS = [("age",), ("sex",), ("height", "weight"), ("activity",), ("goal",), ("horizon_weeks",)]
+# Без этих полей норму не посчитать; срок — дополнительный
+REQUIRED_FIELDS = ("age", "sex", "height", "weight", "activity", "goal")
+
+
+def fields_from_answer(index: int, answer: str, weight: float = None) -> dict:
+    """Поля из ответа на вопрос index; нераспознанные — None. weight нужен для цели вида "хочу 65 кг"."""
+    if index == 0:
+        return {"age": parse_age(answer)}
+    if index == 1:
+        return {"sex": parse_sex(answer)}
+    if index == 2:
+        height, weight = parse_height_weight(answer)
+        return {"height": height, "weight": weight}
+    if index == 3:
+        return {"activity": parse_activity(answer)}
+    if index == 4:
+        return {"goal": parse_goal(answer, weight)}
+    if index == 5:
+        return {"horizon_weeks": parse_horizon(answer)}
+    return {}
+
+
+def profile_fields_from_answers(answers: list[str]) -> tuple[dict, list[str]]:
+    """
+    Поля профиля из ответов в порядке вопросов регистрации
+    (возраст, пол, рост и вес, активность, цель, срок). Возвращает (поля, нераспознанные обязательные ключи).
+    """
+    # не-текстовые ответы (стикер, фото) приходят как None
+    answers = [a or "" for a in answers] + [""] * (len(QUESTION_FIELDS) - len(answers))
+    fields = {}
+    for index, answer in enumerate(answers[:len(QUESTION_FIELDS)]):
+        fields.update(fields_from_answer(index, answer, fields.get("weight")))
+    return fields, [k for k in REQUIRED_FIELDS if fields[k] is None]
+
+
+def normalize_fields(raw: dict) -> dict:
+    """Поля, извлечённые моделью, через те же разборщики (с проверкой диапазонов)."""
+    height, weight = _plausible(_in_limits("height", _first_number(raw.get("height"))),
+                                _in_limits("weight", _first_number(raw.get("weight"))))
+    return {
+        "age": parse_age(str(raw.get("age", ""))),
+        "sex": parse_sex(str(raw.get("sex", ""))),
+        "height": height,
+        "weight": weight,
+        "activity": parse_activity(str(raw.get("activity", ""))),
+        "goal": parse_goal(str(raw.get("goal", "")), weight),
+    }
+
+
+def _first_number(value):
+    numbers = _numbers(str(value if value is not None else ""))
+    return numbers[0] if numbers else None
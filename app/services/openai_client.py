@@ -1,18 +1,242 @@
+import asyncio
+import re
+import time
 from datetime import datetime
-from openai import OpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI
 import json
-from app.config import OPENAI_API_KEY
+from app.config import (
+    OPENAI_API_KEY, OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, MEAL_BATCH_WINDOW_MS, MEAL_BATCH_MAX,
+    LLM_RETRIES, LLM_ATTEMPT_TIMEOUT, LLM_DEADLINE, LLM_HEDGE,
+)
+from app.services.llm_resilience import CircuitBreaker, LLMUnavailable, TRANSIENT_ERRORS, backoff_delay
+from app.services.llm_metrics import llm_metrics, llm_function, current_call, on_response_headers
 from app.services.logger import logger
-from app.services.user_data import get_user_target, get_4weeks_stats
+from app.services.meal_cache import get_meal_cache, normalize_meal_text
+from app.services.singleflight import SingleFlight
+from app.services.meal_index import REUSE_THRESHOLD, few_shot_context, get_meal_index, same_quantities
+from app.services.nutrition_db import parse_meal_locally
+from app.services.user_data import get_user_target, get_4weeks_stats, get_formula_targets
+
+MODEL = "gpt-5-nano-2025-08-07"
+
+# Один пул соединений на процесс: keep-alive к API без повторных TLS-рукопожатий
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=OPENAI_MAX_CONCURRENCY, max_keepalive_connections=OPENAI_MAX_CONCURRENCY),
+    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10.0),
+    event_hooks={"response": [on_response_headers]},
+)
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, timeout=OPENAI_TIMEOUT)
+# Глобальный лимит одновременных запросов к модели
+llm_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+# Одинаковые запросы, пришедшие одновременно (рассылка, групповой чат), выполняются один раз
+inflight = SingleFlight()
+# Размыкается при всплеске ошибок/задержек модели — тогда сразу работает запасной вариант
+breaker = CircuitBreaker()
+# Похожесть соседа из индекса, достаточная для оценки приёма, когда модель недоступна
+ESTIMATE_THRESHOLD = 0.6
+
+
+async def chat_completion(prompt: str, as_json: bool = False):
+    """
+    Запрос к модели с повторами (экспоненциальная задержка с джиттером), таймаутом
+    попытки и общим сроком. При разомкнутом автомате — сразу LLMUnavailable.
+    Ошибка JSON повтором не лечится и пробрасывается как есть.
+    """
+    if not breaker.allow():
+        llm_metrics.record_event("rejected")
+        raise LLMUnavailable("модель временно недоступна")
+    deadline = time.perf_counter() + LLM_DEADLINE
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(_hedged(prompt, as_json), min(LLM_ATTEMPT_TIMEOUT, deadline - started))
+        except json.JSONDecodeError:
+            breaker.record(True, time.perf_counter() - started)  # сервис ответил, плох только ответ
+            raise
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            breaker.record(False, elapsed)
+            if isinstance(e, asyncio.TimeoutError):
+                llm_metrics.record_call(elapsed, "timeout")
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if (not isinstance(e, TRANSIENT_ERRORS) or attempt > LLM_RETRIES
+                    or time.perf_counter() + delay >= deadline or not breaker.allow()):
+                raise
+            llm_metrics.record_event("retry")
+            logger.warning(f"⚠️ [chat_completion] Попытка {attempt} не удалась ({type(e).__name__}), повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record(True, time.perf_counter() - started)
+        return result
+
+
+async def _hedged(prompt: str, as_json: bool):
+    """
+    С LLM_HEDGE: если ответа нет дольше p95 недавних запросов, запускается второй такой же;
+    берётся первый успешный, оставшийся отменяется.
+    """
+    delay = breaker.hedge_delay() if LLM_HEDGE else None
+    first = asyncio.ensure_future(_request(prompt, as_json))
+    if delay is None:
+        return await first
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            llm_metrics.record_event("hedge")
+            tasks.add(asyncio.ensure_future(_request(prompt, as_json)))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        llm_metrics.record_event("hedge_won")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _request(prompt: str, as_json: bool):
+    """
+    Один запрос к модели под общим лимитом параллелизма, возвращает текст ответа
+    (as_json=True — разобранный JSON). Время, токены и исход пишутся в llm_metrics.
+    """
+    started = time.perf_counter()
+    call = {"started": started, "ttfb": None}
+    token = current_call.set(call)
+    try:
+        async with llm_semaphore:
+            call["started"] = time.perf_counter()
+            response = await client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+            )
+    except Exception:
+        llm_metrics.record_call(time.perf_counter() - started, "api_error", call["ttfb"])
+        raise
+    finally:
+        current_call.reset(token)
+
+    content = response.choices[0].message.content.strip()
+    outcome = "ok"
+    try:
+        return json.loads(content) if as_json else content
+    except ValueError:
+        outcome = "json_error"
+        raise
+    finally:
+        llm_metrics.record_call(time.perf_counter() - started, outcome, call["ttfb"],
+                                response.model, response.usage)
+
+
+async def stream_completion_json(prompt: str, on_text):
+    """
+    Потоковый запрос к модели: on_text(накопленный текст) вызывается на каждый фрагмент,
+    в конце ответ разбирается как JSON. Время до первого фрагмента идёт в метрики как TTFB.
+    Повторов нет — часть ответа уже показана пользователю; автомат и общий срок те же.
+    """
+    if not breaker.allow():
+        llm_metrics.record_event("rejected")
+        raise LLMUnavailable("модель временно недоступна")
+    started = time.perf_counter()
+    first_token = None
+    parts = []
+    model = usage = None
+    try:
+        async with asyncio.timeout(LLM_DEADLINE), llm_semaphore:
+            stream = await client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                async for chunk in stream:
+                    model = chunk.model or model
+                    usage = chunk.usage or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(delta)
+                        on_text("".join(parts))
+            finally:
+                # при отмене / таймауте / ошибке on_text соединение возвращается в пул, а не висит
+                await stream.close()
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        elapsed = time.perf_counter() - started
+        breaker.record(False, elapsed)
+        llm_metrics.record_call(elapsed, "timeout" if isinstance(e, TimeoutError) else "api_error", first_token)
+        raise
+
+    elapsed = time.perf_counter() - started
+    breaker.record(True, elapsed)
+    outcome = "ok"
+    try:
+        return json.loads("".join(parts).strip())
+    except ValueError:
+        outcome = "json_error"
+        raise
+    finally:
+        llm_metrics.record_call(elapsed, outcome, first_token, model, usage)
+
+
+def partial_json_string(text: str, key: str):
+    """
+    Значение строкового поля key из незаконченного JSON ('{"summary": "Тебе стоит...'):
+    то, что уже пришло, без хвоста с недописанной escape-последовательностью. None — поля ещё нет.
+    """
+    match = re.search(rf'"{key}"\s*:\s*"', text)
+    if match is None:
+        return None
+    raw = text[match.end():]
+    i = 0
+    while i < len(raw):
+        if raw[i] == "\\":
+            i += 2
+            continue
+        if raw[i] == '"':
+            raw = raw[:i]
+            break
+        i += 1
+    for cut in range(7):  # самая длинная escape-последовательность — \uXXXX
+        try:
+            return json.loads(f'"{raw[:len(raw) - cut]}"', strict=False)
+        except ValueError:
+            continue
+    return None
+
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+async def close_client():
+    """Закрывает пул соединений (при остановке бота)."""
+    await client.close()
 
-def get_user_goal(answers_text: str) -> dict:
+
+async def _get_user_goal(answers_text: str) -> dict:
+    """
+    Запасной разбор анкеты: извлекает поля профиля из свободных ответов, когда их не
+    разобрал nutrition_utils. Норму калорий и БЖУ модель не считает — это делает calculate_targets.
+    """
+    llm_function.set("get_user_goal")
     logger.info("🧩 [get_user_goal] Новый запрос профиля от пользователя")
 
     prompt = f"""
     Ты — нутрициолог-ассистент. 
-    На основе ответов пользователя составь его профиль питания в формате JSON.
+    Извлеки из ответов пользователя параметры профиля в формате JSON.
 
     Формат JSON (ключи строго такие):
     {{
@@ -20,14 +244,12 @@ def get_user_goal(answers_text: str) -> dict:
       "sex": "м" или "ж",
       "height": число в см,
       "weight": число в кг,
-      "activity": текст коротко (например "сидячая", "умеренная", "высокая"),
-      "goal": текст ("похудение", "набор", "поддержание"),
-      "target_cal": число — рассчитанная дневная норма калорий по формуле Mifflin–St Jeor,
-      "p_goal": число — белки (г),
-      "f_goal": число — жиры (г),
-      "c_goal": число — углеводы (г)
+      "activity": одно из "сидячая", "низкая", "умеренная", "высокая", "очень высокая",
+      "goal": одно из "похудение", "набор", "поддержание"
     }}
 
+    Если значение не удаётся определить, поставь null.
+
     Ответ должен содержать только JSON без комментариев и текста.
 
     Ответы пользователя:
@@ -35,13 +257,7 @@ def get_user_goal(answers_text: str) -> dict:
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-nano-2025-08-07",
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        content = response.choices[0].message.content.strip()
-        profile = json.loads(content)
+        profile = await chat_completion(prompt, as_json=True)
 
         logger.info(f"✅ [get_user_goal] Профиль успешно создан: {profile}")
         return profile
@@ -51,10 +267,7 @@ def get_user_goal(answers_text: str) -> dict:
         return {}
 
 
-async def parse_meal_text(text: str, user_id: int) -> dict:
-    logger.info(f"🍽 [parse_meal_text] Пользователь {user_id}: '{text}'")
-
-    prompt = f"""
+MEAL_PROMPT_HEADER = """
 Ты помощник по подсчёту БЖУ и калорий. 
 Твоя задача — преобразовать текст о приёме пищи в JSON со следующими полями:
 
@@ -64,6 +277,9 @@ async def parse_meal_text(text: str, user_id: int) -> dict:
 - calories: калории
 - details: confidence (float), внутренние предположения и источники данных  
 
+"""
+
+MEAL_PROMPT_RULES = """
 Правила:
 
 1. Пользователь может писать:
@@ -81,22 +297,184 @@ async def parse_meal_text(text: str, user_id: int) -> dict:
    - Укажи расчеты в поле details
 
 4. Никогда не задавай пользователю вопросов — делай оценки самостоятельно.
+"""
+
+
+async def _parse_meal_llm(text: str, examples: str = "") -> dict:
+    """Один приём — один запрос к модели; ошибки запроса и JSON пробрасываются."""
+    prompt = f"""{MEAL_PROMPT_HEADER}{MEAL_PROMPT_RULES}{examples}
 
 Текст для анализа: "{text}"
 """
+    return await chat_completion(prompt, as_json=True)
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-5-nano-2025-08-07",
-            messages=[{"role": "user", "content": prompt}],
-        )
 
-        content = response.choices[0].message.content.strip()
-        data = json.loads(content)
+# --- Микропакеты разбора приёмов ---
+class MealBatcher:
+    """
+    Собирает тексты приёмов, пришедшие в пределах окна (window секунд) или до max_items штук,
+    и разбирает их одним запросом: общие инструкции промпта оплачиваются один раз, ответ —
+    JSON-массив объектов с полем id. Если ответ пакета не разобрался целиком или по
+    отдельному элементу, такие элементы переспрашиваются по одному.
+    """
+
+    def __init__(self, window: float, max_items: int):
+        self.window = window
+        self.max_items = max_items
+        self._pending: list[tuple[str, str, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+        self.counters = {"batches": 0, "items": 0, "fallbacks": 0}
+
+    async def submit(self, text: str, examples: str = "") -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, examples, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self.counters["batches"] += 1
+        self.counters["items"] += len(batch)
+        results = {}
+        if len(batch) > 1:
+            try:
+                parsed = await chat_completion(self._prompt(batch), as_json=True)
+                if isinstance(parsed, dict):
+                    parsed = parsed.get("items", [])
+                for item in parsed if isinstance(parsed, list) else []:
+                    if isinstance(item, dict) and "calories" in item and str(item.get("id", "")).isdigit():
+                        results[int(item.pop("id"))] = item
+            except Exception as e:
+                logger.error(f"❌ [MealBatcher] Ошибка пакета из {len(batch)}: {e}")
+
+        async def resolve(i, text, examples, future):
+            if i not in results:
+                if len(batch) > 1:
+                    self.counters["fallbacks"] += 1
+                try:
+                    results[i] = await _parse_meal_llm(text, examples)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+            if not future.done():
+                future.set_result(results[i])
+
+        await asyncio.gather(*(resolve(i, *item) for i, item in enumerate(batch)))
+
+    @staticmethod
+    def _prompt(batch) -> str:
+        items = []
+        for i, (text, examples, _) in enumerate(batch):
+            items.append(f'{i}. "{text}"')
+            if examples:
+                items.append(examples.strip("\n"))
+        items = "\n".join(items)
+        return f"""
+Ты помощник по подсчёту БЖУ и калорий.
+Ниже несколько независимых текстов о приёмах пищи, у каждого номер (id).
+Для каждого верни объект JSON с полями:
+
+- id: номер текста
+- protein: количество белков в граммах
+- fat: количество жиров в граммах
+- carbs: количество углеводов в граммах
+- calories: калории
+- details: confidence (float), внутренние предположения и источники данных
+{MEAL_PROMPT_RULES}
+Ответ — только JSON-массив таких объектов, по одному на каждый текст, без лишнего текста.
+
+Тексты для анализа:
+{items}
+"""
+
+
+# Пакетирование включается ненулевым окном MEAL_BATCH_WINDOW_MS
+meal_batcher = MealBatcher(MEAL_BATCH_WINDOW_MS / 1000, MEAL_BATCH_MAX) if MEAL_BATCH_WINDOW_MS > 0 else None
+
+
+async def _parse_meal_text(text: str, user_id: int) -> dict:
+    llm_function.set("parse_meal_text")
+    logger.info(f"🍽 [parse_meal_text] Пользователь {user_id}: '{text}'")
+
+    # 1️⃣ Все продукты есть в локальной таблице — считаем без сети
+    local = parse_meal_locally(text)
+    if local is not None:
+        local["date"] = datetime.today().strftime("%Y-%m-%d")
+        llm_metrics.record_cache_hit("local_db")
+        logger.info(f"⚡ [parse_meal_text] Локальная таблица для user_id={user_id}: {local}")
+        return local
+
+    # 2️⃣ Уже разобранный ранее текст
+    cache = get_meal_cache()
+    # LRU отвечает сразу; SQLite — в потоке, чтобы диск не останавливал цикл событий
+    cached = cache.get_memory(text)
+    if cached is None:
+        cached = await asyncio.to_thread(cache.get_disk, text)
+    if cached is not None:
+        cached["date"] = datetime.today().strftime("%Y-%m-%d")
+        llm_metrics.record_cache_hit("cache")
+        logger.info(f"⚡ [parse_meal_text] Из кэша для user_id={user_id}: {cached}")
+        return cached
+
+    # 3️⃣ Почти такой же текст с теми же количествами уже разбирался — берём его макросы,
+    # иначе соседей даём модели как примеры ("овсянка 200 г" не подходит для "овсянка 400 г")
+    index = get_meal_index()
+    neighbours = await asyncio.to_thread(index.search, text)
+    reusable = next((n for n in neighbours if n[0] >= REUSE_THRESHOLD and same_quantities(text, n[1])), None)
+    if reusable is not None:
+        score, matched, macros = reusable
+        similar = {
+            **{k: round(v, 1) for k, v in macros.items()},
+            "details": {"source": "vector_index", "confidence": round(score, 3), "matched": matched},
+            "date": datetime.today().strftime("%Y-%m-%d"),
+        }
+        llm_metrics.record_cache_hit("vector_index")
+        logger.info(f"⚡ [parse_meal_text] Похожий приём ({score:.3f}) для user_id={user_id}: {similar}")
+        return similar
+    examples = few_shot_context(neighbours)
+    if examples:
+        examples = f"\nРанее разобранные похожие приёмы (ориентир по порциям и БЖУ):\n{examples}\n"
 
+    try:
+        started = time.perf_counter()
+        if meal_batcher is not None:
+            data = await meal_batcher.submit(text, examples)
+        else:
+            data = await _parse_meal_llm(text, examples)
+        elapsed = time.perf_counter() - started
+
+        if "clarification" not in data:
+            # дата не кэшируется: она своя у каждого приёма
+            await asyncio.to_thread(cache.put, text, {k: v for k, v in data.items() if k != "date"}, elapsed)
+            await asyncio.to_thread(index.add, text, data)
         data.setdefault("date", datetime.today().strftime("%Y-%m-%d"))
         logger.info(f"✅ [parse_meal_text] Результат для user_id={user_id}: {data}")
 
+    except (LLMUnavailable, openai.APIError, *TRANSIENT_ERRORS) as e:
+        # 4️⃣ Модель недоступна — оценка без неё, приём помечается как estimated
+        logger.error(f"❌ [parse_meal_text] Модель недоступна для user_id={user_id}: {type(e).__name__} {e}")
+        estimate = _estimate_meal(text, neighbours)
+        if estimate is None:
+            return {"clarification": "Сервис подсчёта сейчас недоступен, попробуй через пару минут."}
+        estimate["date"] = datetime.today().strftime("%Y-%m-%d")
+        llm_metrics.record_cache_hit("estimated")
+        logger.info(f"🩹 [parse_meal_text] Оценка без модели для user_id={user_id}: {estimate}")
+        return estimate
+
     except Exception as e:
         logger.error(f"❌ [parse_meal_text] Ошибка для user_id={user_id}: {e}")
         return {"clarification": "Не понял, можешь описать продукты точнее?"}
@@ -105,17 +483,44 @@ async def parse_meal_text(text: str, user_id: int) -> dict:
     data.setdefault("date", datetime.today().strftime("%Y-%m-%d"))
     return data
 
-async def ai_assistant_feedback(user_id: int, user_request: str) -> dict:
+
+def _estimate_meal(text: str, neighbours: list):
+    """
+    Запасная оценка, пока модель недоступна: достаточно похожий приём из индекса,
+    иначе сумма распознанных локальной таблицей продуктов. None — оценить нечем.
+    """
+    if neighbours and neighbours[0][0] >= ESTIMATE_THRESHOLD:
+        score, matched, macros = neighbours[0]
+        estimate = {
+            **{k: round(v, 1) for k, v in macros.items()},
+            "details": {"source": "vector_index", "confidence": round(score / 2, 3), "matched": matched},
+        }
+    else:
+        estimate = parse_meal_locally(text, partial=True)
+        if estimate is None:
+            return None
+    estimate["estimated"] = True
+    estimate["details"]["estimated"] = True
+    return estimate
+
+async def _ai_assistant_feedback(user_id: int, user_request: str, on_summary=None) -> dict:
     """
     Пользователь вызывает AI-ассистента для корректировки цели.
     Берём его текущую цель, статистику за 4 недели и запрос пользователя.
     Передаём в GPT и получаем новую цель в формате JSON.
+    on_summary — ответ читается потоком, и callback получает поле summary по мере прихода.
     """
+    llm_function.set("ai_assistant_feedback")
     logger.info(f"🤖 [ai_assistant_feedback] Вызов ассистента user_id={user_id}")
 
     # 1️⃣ Получаем текущую цель и статистику
-    target = get_user_target(user_id)
-    stats_text = get_4weeks_stats(user_id)
+    target = await get_user_target(user_id)
+    stats_text = await get_4weeks_stats(user_id)
+    formula = await get_formula_targets(user_id)
+    formula_text = "\n".join(
+        f"- {goal}: {t['target_cal']} ккал, Б {t['p_goal']} / Ж {t['f_goal']} / У {t['c_goal']}"
+        for goal, t in formula.items()
+    ) or "нет данных профиля"
 
     prompt = f"""
 Ты — ИИ нутрициолог.
@@ -130,6 +535,9 @@ async def ai_assistant_feedback(user_id: int, user_request: str) -> dict:
 Данные за последние 4 недели:
 {stats_text}
 
+Норма по формуле Mifflin–St Jeor для профиля пользователя (ориентир для новой цели):
+{formula_text}
+
 Твоя задача:
 1. Проанализируй, чего не хватает или перебор.
 2. Предложи новую цель (калории и БЖУ).
@@ -152,17 +560,22 @@ async def ai_assistant_feedback(user_id: int, user_request: str) -> dict:
 """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-nano-2025-08-07",
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        content = response.choices[0].message.content.strip()
-        logger.info(f"📦 [ai_assistant_feedback] Raw GPT response: {content}")
-
         try:
-            result = json.loads(content)
-        except Exception as e:
+            if on_summary is None:
+                result = await chat_completion(prompt, as_json=True)
+            else:
+                shown = ""
+
+                def on_text(text: str):
+                    nonlocal shown
+                    summary = partial_json_string(text, "summary")
+                    if summary and summary != shown:
+                        shown = summary
+                        on_summary(summary)
+
+                result = await stream_completion_json(prompt, on_text)
+            logger.info(f"📦 [ai_assistant_feedback] Raw GPT response: {result}")
+        except json.JSONDecodeError as e:
             logger.error(f"❌ [ai_assistant_feedback] Ошибка парсинга JSON: {e}")
             return {"error": "⚠️ Не удалось распарсить ответ ИИ."}
 
@@ -177,3 +590,25 @@ async def ai_assistant_feedback(user_id: int, user_request: str) -> dict:
     except Exception as e:
         logger.error(f"❌ [ai_assistant_feedback] Ошибка при вызове GPT: {e}")
         return {"error": "⚠️ Не удалось получить ответ от ИИ-ассистента."}
+
+
+# --- Публичные вызовы: одинаковые одновременные запросы схлопываются ---
+async def get_user_goal(answers_text: str) -> dict:
+    key = ("goal", " ".join(answers_text.split()))
+    return await inflight.do(key, lambda: _get_user_goal(answers_text))
+
+
+async def parse_meal_text(text: str, user_id: int) -> dict:
+    # результат не зависит от пользователя — ключ только по нормализованному тексту
+    key = ("meal", normalize_meal_text(text) or text.strip())
+    return await inflight.do(key, lambda: _parse_meal_text(text, user_id))
+
+
+async def ai_assistant_feedback(user_id: int, user_request: str, on_summary=None) -> dict:
+    """
+    on_summary(текст) получает summary по мере генерации. Одинаковые одновременные запросы
+    схлопываются: поток показывает тот, кто спросил первым, остальные ждут общий результат.
+    """
+    # ответ зависит от цели и статистики пользователя — ключ включает user_id
+    key = ("feedback", user_id, " ".join(user_request.lower().split()))
+    return await inflight.do(key, lambda: _ai_assistant_feedback(user_id, user_request, on_summary))
@@ -0,0 +1,86 @@
+from datetime import date
+
+
+class FenwickTree:
+    """Дерево Фенвика по нескольким колонкам: точечное обновление и префиксная сумма за O(log n)."""
+
+    def __init__(self, size: int, width: int):
+        self.size = size
+        self.width = width
+        self._tree = [[0.0] * width for _ in range(size + 1)]
+
+    def add(self, pos: int, values):
+        """Прибавляет values к элементу pos (0-based)."""
+        i = pos + 1
+        while i <= self.size:
+            node = self._tree[i]
+            for k, v in enumerate(values):
+                node[k] += v
+            i += i & -i
+
+    def prefix(self, pos: int) -> list[float]:
+        """Сумма элементов [0, pos] (0-based). pos < 0 — пустая сумма."""
+        result = [0.0] * self.width
+        i = min(pos + 1, self.size)
+        while i > 0:
+            node = self._tree[i]
+            for k in range(self.width):
+                result[k] += node[k]
+            i -= i & -i
+        return result
+
+    def range_sum(self, start: int, end: int) -> list[float]:
+        """Сумма элементов [start, end] (0-based, включительно)."""
+        hi = self.prefix(end)
+        lo = self.prefix(start - 1)
+        return [a - b for a, b in zip(hi, lo)]
+
+
+class DailyRangeIndex:
+    """
+    Индекс суточных итогов одного пользователя по номеру дня (date.toordinal()).
+    Хранит точки и дерево Фенвика; при выходе дня за границы дерево
+    перестраивается с удвоением ёмкости (амортизированно O(log n) на обновление).
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self._points: dict[int, list[float]] = {}
+        self._base = 0
+        self._tree = FenwickTree(0, width)
+
+    def _rebuild(self, lo: int, hi: int):
+        size = max(hi - lo + 1, 2 * self._tree.size, 32)
+        self._base = lo
+        self._tree = FenwickTree(size, self.width)
+        for day, values in self._points.items():
+            self._tree.add(day - self._base, values)
+
+    def add(self, day: int, values):
+        """Прибавляет values к дню day (ordinal)."""
+        point = self._points.setdefault(day, [0.0] * self.width)
+        for k, v in enumerate(values):
+            point[k] += v
+        if not self._tree.size or day < self._base or day >= self._base + self._tree.size:
+            days = self._points.keys()
+            self._rebuild(min(days), max(days))
+        else:
+            self._tree.add(day - self._base, values)
+
+    def range_sum(self, start: int, end: int) -> list[float]:
+        """Сумма по дням [start, end] (ordinal, включительно)."""
+        if not self._tree.size or end < start:
+            return [0.0] * self.width
+        lo = max(start, self._base) - self._base
+        hi = min(end, self._base + self._tree.size - 1) - self._base
+        if hi < lo:
+            return [0.0] * self.width
+        return self._tree.range_sum(lo, hi)
+
+
+def day_ordinal(day: str):
+    """'YYYY-MM-DD' -> ordinal или None для некорректной даты."""
+    try:
+        return date.fromisoformat(day).toordinal()
+    except (TypeError, ValueError):
+        return None
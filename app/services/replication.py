@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import threading
+from pathlib import Path
+
+from app.services.csv_client import USER_FIELDS, MEAL_FIELDS
+from app.services.logger import logger
+
+CHANGES_FILE = Path("data/changes.jsonl")
+CURSOR_FILE = Path("data/changes.cursor")
+# Сколько изменений отправлять за один проход и как часто проверять журнал (секунды)
+REPLICATION_BATCH = 500
+REPLICATION_INTERVAL = 5
+# Полностью отправленный журнал обрезается, когда вырастает больше этого размера
+ROTATE_BYTES = 1 << 20
+
+SHEET_MEAL_FIELDS = [*MEAL_FIELDS, "meal_id"]
+
+
+class ChangeLog:
+    """
+    Журнал изменений для репликации (JSON Lines, поле seq — сквозной номер).
+    Пишется подписчиком AsyncStorage после каждой группы записей; курсор
+    (seq + смещение в файле последнего отправленного изменения) хранится отдельно
+    и переживает перезапуск.
+    """
+
+    def __init__(self, storage, changes_file=CHANGES_FILE, cursor_file=CURSOR_FILE):
+        self.storage = storage
+        self.changes_file = Path(changes_file)
+        self.cursor_file = Path(cursor_file)
+        self.lock = threading.Lock()
+        self.changes_file.touch(exist_ok=True)
+        self.cursor = self._load_cursor()
+        self._next_seq = self.cursor["seq"] + 1
+        for change in self._read_from(self.cursor["offset"])[0]:
+            self._next_seq = max(self._next_seq, change["seq"] + 1)
+
+    def _load_cursor(self) -> dict:
+        try:
+            cursor = json.loads(self.cursor_file.read_text(encoding="utf-8"))
+            return {"seq": int(cursor["seq"]), "offset": int(cursor["offset"])}
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return {"seq": 0, "offset": 0}
+
+    # --- Запись изменений ---
+    def on_committed(self, ops):
+        changes = [c for c in (self._change(*op) for op in ops) if c]
+        if not changes:
+            return
+        with self.lock:
+            lines = []
+            for change in changes:
+                change["seq"] = self._next_seq
+                self._next_seq += 1
+                lines.append(json.dumps(change, ensure_ascii=False) + "\n")
+            with open(self.changes_file, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+
+    def _change(self, method: str, args: tuple, result):
+        if method in ("add_user", "update_user_target"):
+            user_id = args[0][0] if method == "add_user" else args[0]
+            user = self.storage.get_user(user_id)
+            if user is None:
+                return None
+            return {"op": "user", "user_id": str(user_id), "row": [user.get(k, "") for k in USER_FIELDS]}
+        if method == "delete_user":
+            return {"op": "delete_user", "user_id": str(args[0])}
+        if method == "add_meal":
+            meal = ["" if v is None else str(v) for v in args[0]][:len(MEAL_FIELDS)]
+            meal += [""] * (len(MEAL_FIELDS) - len(meal))
+            return {"op": "meal", "user_id": meal[0], "meal_id": str(result), "row": [*meal, str(result)]}
+        if method == "delete_meal":
+            if result is None:
+                return None
+            return {"op": "delete_meal", "user_id": str(args[0]), "meal_id": str(args[1])}
+        if method in ("save_users", "save_meals"):
+            return {"op": "resync"}
+        return None
+
+    # --- Чтение для отправки ---
+    def _read_from(self, offset: int, limit=None):
+        changes = []
+        with open(self.changes_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n") or (limit is not None and len(changes) >= limit):
+                    break
+                offset += len(line)
+                try:
+                    changes.append(json.loads(line))
+                except ValueError:
+                    continue
+        return changes, offset
+
+    def pending(self, limit=None):
+        """Неотправленные изменения после курсора: (изменения, смещение конца прочитанного)."""
+        with self.lock:
+            return self._read_from(self.cursor["offset"], limit)
+
+    def commit(self, changes: list[dict], offset: int):
+        """Сдвигает курсор за отправленные изменения; полностью отправленный большой журнал обрезается."""
+        with self.lock:
+            seq = changes[-1]["seq"] if changes else self.cursor["seq"]
+            if offset >= ROTATE_BYTES and offset == os.path.getsize(self.changes_file):
+                with open(self.changes_file, "w", encoding="utf-8"):
+                    pass
+                offset = 0
+            self.cursor = {"seq": seq, "offset": offset}
+            tmp = self.cursor_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.cursor), encoding="utf-8")
+            os.replace(tmp, self.cursor_file)
+
+
+class SheetsReplicator:
+    """
+    Отправляет журнал изменений в листы users/meals (SheetMirror из gsheet_client).
+    За проход изменения схлопываются: по пользователю остаётся последнее состояние,
+    приём, добавленный и удалённый в одной пачке, не отправляется вовсе.
+    На пачку — не больше одного batch_update на обновления, одного на удаления
+    и одного append_rows на лист, независимо от числа строк.
+    """
+
+    def __init__(self, change_log: ChangeLog, users_mirror, meals_mirror, batch_size=REPLICATION_BATCH):
+        self.log = change_log
+        self.users = users_mirror
+        self.meals = meals_mirror
+        self.batch_size = batch_size
+
+    def ship_once(self) -> int:
+        """Отправляет одну пачку изменений, возвращает их число."""
+        changes, offset = self.log.pending(self.batch_size)
+        if not changes:
+            return 0
+        if any(c["op"] == "resync" for c in changes):
+            # полная перезапись листов из текущего состояния хранилища покрывает весь журнал
+            changes, offset = self.log.pending()
+            self._resync()
+        else:
+            self._apply(changes)
+        self.log.commit(changes, offset)
+        return len(changes)
+
+    def _resync(self):
+        storage = self.log.storage
+        self.users.rewrite(USER_FIELDS, [[u.get(k, "") for k in USER_FIELDS] for u in storage.get_users()])
+        self.meals.rewrite(SHEET_MEAL_FIELDS, [[str(m.get(k, "")) for k in SHEET_MEAL_FIELDS]
+                                               for m in storage.get_meals()])
+
+    def _apply(self, changes: list[dict]):
+        users: dict[str, list | None] = {}
+        meal_adds: dict[tuple[str, str], list] = {}
+        meal_deletes: set[tuple[str, str]] = set()
+        wiped: set[str] = set()
+        for change in changes:
+            op, user_id = change["op"], change.get("user_id", "")
+            if op == "user":
+                users[user_id] = change["row"]
+            elif op == "delete_user":
+                users[user_id] = None
+                wiped.add(user_id)
+                meal_adds = {k: v for k, v in meal_adds.items() if k[0] != user_id}
+            elif op == "meal":
+                meal_adds[(user_id, change["meal_id"])] = change["row"]
+            elif op == "delete_meal":
+                key = (user_id, change["meal_id"])
+                if meal_adds.pop(key, None) is None:
+                    meal_deletes.add(key)
+
+        self.meals.refresh()
+        if self.meals.header[:len(SHEET_MEAL_FIELDS)] != SHEET_MEAL_FIELDS:
+            self.meals.set_header(SHEET_MEAL_FIELDS)
+        self.meals.delete_many(pos for pos, m in enumerate(self.meals.rows)
+                               if m.get("user_id") in wiped or (m.get("user_id"), m.get("meal_id")) in meal_deletes)
+        # повтор пачки после сбоя не должен дублировать уже отправленные приёмы
+        shipped = {(m.get("user_id"), m.get("meal_id")) for m in self.meals.rows}
+        self.meals.append_many([row for key, row in meal_adds.items() if key not in shipped])
+
+        self.users.refresh()
+        if self.users.header[:len(USER_FIELDS)] != USER_FIELDS:
+            self.users.set_header(USER_FIELDS)
+        positions: dict[str, list[int]] = {}
+        for pos, u in enumerate(self.users.rows):
+            positions.setdefault(u.get("user_id", ""), []).append(pos)
+        self.users.update_many({positions[uid][-1]: row for uid, row in users.items()
+                                if row is not None and uid in positions})
+        self.users.delete_many(pos for uid, row in users.items() if row is None for pos in positions.get(uid, ()))
+        self.users.append_many([row for uid, row in users.items() if row is not None and uid not in positions])
+
+    async def run(self, interval=REPLICATION_INTERVAL):
+        while True:
+            try:
+                shipped = await asyncio.to_thread(self.ship_once)
+                if shipped:
+                    logger.info(f"📤 [SheetsReplicator] Отправлено изменений: {shipped}")
+                if shipped >= self.batch_size:
+                    continue
+            except Exception as e:
+                # курсор не сдвинут — пачка уйдёт повторно в следующий проход
+                logger.error(f"❌ [SheetsReplicator] Ошибка репликации: {e}")
+            await asyncio.sleep(interval)
+
+
+def start_replication(async_storage) -> asyncio.Task:
+    """Подписывает журнал изменений на запись в хранилище и запускает фоновую отправку в Google Sheets."""
+    from app.services.gsheet_client import GSheetClient
+
+    change_log = ChangeLog(async_storage.sync)
+    async_storage.listeners.append(change_log)
+    sheets = GSheetClient()
+    replicator = SheetsReplicator(change_log, sheets.users, sheets.meals)
+    return asyncio.create_task(replicator.run())
@@ -0,0 +1,219 @@
+import csv
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+from app.services.csv_client import (
+    CSVClient, MealLog, DailyRollup, USERS_FILE, MEALS_FILE, USER_FIELDS, MEAL_FIELDS, MEAL_LOG_FIELDS,
+    MACROS, COMPACT_DEAD_RATIO, COMPACT_MIN_DEAD, get_user_registry,
+)
+
+SHARDS_DIR = Path("data/meals")
+# Маркер выполненного переноса из общего meals.csv
+MIGRATED_MARKER = ".migrated"
+# Сколько шардов держать разобранными в памяти
+SHARD_CACHE_SIZE = 1024
+
+
+class ShardedCSVClient(CSVClient):
+    """
+    CSV-хранилище с отдельным журналом приёмов на пользователя: data/meals/<user_id>.csv.
+    Формат шарда — тот же журнал MealLog (meal_id + надгробия), meal_id нумеруются внутри шарда.
+    Запросы по пользователю читают только его файл, удаление профиля — один unlink.
+    Суточные итоги шарда считаются в памяти при его загрузке (DailyRollup без файла).
+    Профили по-прежнему хранятся в users.csv (методы профилей наследуются от CSVClient).
+    """
+
+    def __init__(self, shards_dir=SHARDS_DIR, users_file=USERS_FILE, meals_file=MEALS_FILE,
+                 cache_size=SHARD_CACHE_SIZE):
+        # CSVClient.__init__ не вызываем: общего meals.csv и daily_totals.csv здесь нет
+        self.users_file = users_file
+        self.shards_dir = Path(shards_dir)
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        if not os.path.exists(users_file):
+            with open(users_file, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(USER_FIELDS)
+        self.users = get_user_registry(users_file)
+        self.cache_size = cache_size
+        # запись сериализуется: у файла шарда в любой момент один объект MealLog
+        self.lock = threading.RLock()
+        self._shards: OrderedDict[int, tuple[MealLog, DailyRollup]] = OrderedDict()
+        self.migrate_from_csv(meals_file)
+
+    # --- Шарды ---
+    def shard_path(self, user_id) -> Path:
+        return self.shards_dir / f"{int(user_id)}.csv"
+
+    def _shard(self, user_id, create=False):
+        """(MealLog, DailyRollup) шарда пользователя или None, если файла нет и create=False."""
+        user_id = int(user_id)
+        with self.lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                self._shards.move_to_end(user_id)
+                return shard
+            path = self.shard_path(user_id)
+            if not path.exists():
+                if not create:
+                    return None
+                _write_header(path)
+            meals = MealLog(path)
+            shard = self._shards[user_id] = (meals, DailyRollup(None, meals))
+            while len(self._shards) > self.cache_size:
+                self._shards.popitem(last=False)
+            return shard
+
+    def _shard_ids(self) -> list[int]:
+        ids = []
+        for name in os.listdir(self.shards_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == ".csv" and stem.isdigit():
+                ids.append(int(stem))
+        return sorted(ids)
+
+    # --- Миграция ---
+    def migrate_from_csv(self, meals_file=MEALS_FILE) -> bool:
+        """
+        Однократно раскладывает общий meals.csv по шардам (meal_id сохраняются).
+        Исходный файл не удаляется. Возвращает True, если перенос был.
+        """
+        marker = self.shards_dir / MIGRATED_MARKER
+        if marker.exists():
+            return False
+        by_user: dict[int, list[dict]] = {}
+        if os.path.exists(meals_file):
+            for meal in MealLog(meals_file).all():
+                try:
+                    by_user.setdefault(int(meal["user_id"]), []).append(meal)
+                except (KeyError, ValueError, TypeError):
+                    continue
+        with self.lock:
+            for user_id, meals in by_user.items():
+                path = self.shard_path(user_id)
+                _write_header(path)
+                MealLog(path).replace_all(meals)
+                self._shards.pop(user_id, None)
+            marker.write_text(f"{len(by_user)} users, {sum(map(len, by_user.values()))} meals\n", encoding="utf-8")
+        return True
+
+    # --- Приёмы пищи ---
+    def get_meals(self):
+        meals = []
+        for user_id in self._shard_ids():
+            shard = self._shard(user_id)
+            if shard is not None:
+                meals.extend(shard[0].all())
+        return meals
+
+    def add_meals(self, meals_data: list) -> list[int]:
+        """Дописывает приёмы: по одной записи (write + fsync) в шард каждого пользователя."""
+        by_user: dict[int, list[tuple[int, dict]]] = {}
+        for pos, meal_data in enumerate(meals_data):
+            meal = {k: "" if v is None else str(v) for k, v in zip(MEAL_FIELDS, meal_data)}
+            by_user.setdefault(int(meal["user_id"]), []).append((pos, meal))
+
+        meal_ids = [0] * len(meals_data)
+        with self.lock:
+            for user_id, items in by_user.items():
+                meals, totals = self._shard(user_id, create=True)
+                totals.ensure_loaded()
+                with meals.lock:
+                    ids = meals.append_many([meal for _, meal in items])
+                    totals.add_meals([meal for _, meal in items])
+                for (pos, _), meal_id in zip(items, ids):
+                    meal_ids[pos] = meal_id
+        return meal_ids
+
+    def get_user_meals(self, user_id) -> list[tuple[int, dict]]:
+        shard = self._shard(user_id)
+        return shard[0].user_meals(user_id) if shard else []
+
+    def get_last_meal(self, user_id):
+        shard = self._shard(user_id)
+        return shard[0].last(user_id) if shard else None
+
+    def get_meals_for_day(self, user_id, for_date=None) -> list[dict]:
+        if for_date is None:
+            for_date = date.today().isoformat()
+        shard = self._shard(user_id)
+        return shard[0].day_meals(user_id, for_date) if shard else []
+
+    def delete_meal(self, user_id, meal_id: int):
+        with self.lock:
+            shard = self._shard(user_id)
+            if shard is None:
+                return None
+            meals, totals = shard
+            totals.ensure_loaded()
+            with meals.lock:
+                meal = meals.get(meal_id)
+                if meal is None or meal.get("user_id") != str(user_id):
+                    return None
+                meals.delete([meal_id])
+                totals.remove_meal(meal)
+            return meal
+
+    def delete_user(self, user_id):
+        """Удаляет профиль и файл приёмов пользователя."""
+        self.users.remove(user_id)
+        with self.lock:
+            self._shards.pop(int(user_id), None)
+            try:
+                os.remove(self.shard_path(user_id))
+            except FileNotFoundError:
+                pass
+
+    def compact_meals(self, threshold=COMPACT_DEAD_RATIO, min_dead=COMPACT_MIN_DEAD) -> bool:
+        """Сжимает журналы загруженных шардов, где мёртвых записей больше порога."""
+        with self.lock:
+            shards = [meals for meals, _ in self._shards.values()]
+        compacted = False
+        for meals in shards:
+            if meals.dead_ratio() >= threshold and meals.dead_count() >= min_dead:
+                compacted = meals.compact() or compacted
+        return compacted
+
+    def save_meals(self, meals: list[dict]):
+        """Полностью заменяет приёмы: шарды перезаписываются, лишние удаляются."""
+        by_user: dict[int, list[dict]] = {}
+        for meal in meals:
+            try:
+                by_user.setdefault(int(meal["user_id"]), []).append(meal)
+            except (KeyError, ValueError, TypeError):
+                continue
+        with self.lock:
+            for user_id in self._shard_ids():
+                if user_id not in by_user:
+                    self._shards.pop(user_id, None)
+                    os.remove(self.shard_path(user_id))
+            for user_id, user_meals in by_user.items():
+                meals_log, _ = self._shard(user_id, create=True)
+                meals_log.replace_all(user_meals)
+
+    # --- Итоги ---
+    def get_daily_totals(self, user_id, for_date=None):
+        if for_date is None:
+            for_date = date.today().isoformat()
+        shard = self._shard(user_id)
+        if shard is None:
+            return {k: 0.0 for k in MACROS}
+        return shard[1].get(user_id, for_date)
+
+    def get_range_totals(self, user_id, start: str, end: str) -> dict:
+        shard = self._shard(user_id)
+        if shard is None:
+            return {**{k: 0.0 for k in MACROS}, "days": 0}
+        return shard[1].range_totals(user_id, start, end)
+
+
+def _write_header(path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(MEAL_LOG_FIELDS)
+
+
+if __name__ == "__main__":
+    # Перенос data/meals.csv в шарды: python -m app.services.sharded_client
+    client = ShardedCSVClient()
+    print(f"✅ Шарды: {client.shards_dir}, пользователей с приёмами: {len(client._shard_ids())}")
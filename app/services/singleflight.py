@@ -0,0 +1,36 @@
+import asyncio
+import copy
+
+
+class SingleFlight:
+    """
+    Таблица запросов «в полёте»: одновременные вызовы с одинаковым ключом ждут
+    один общий future вместо повторного запроса. Каждый вызывающий получает
+    свою копию результата; отмена одного ожидающего не отменяет общий запрос.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.counters = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key, factory):
+        """factory — функция без аргументов, возвращающая корутину; вызывается только первым."""
+        self.counters["calls"] += 1
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self.counters["coalesced"] += 1
+        return copy.deepcopy(await asyncio.shield(future))
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # ошибка уже доставлена ожидающим; не даём asyncio ругаться на «необработанную»
+            future.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,281 @@
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+from app.services.csv_client import USERS_FILE, MEALS_FILE, USER_FIELDS, MEAL_FIELDS, MACROS, safe_float
+
+SQLITE_FILE = Path("data/hungrylogs.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    age TEXT, sex TEXT, height TEXT, weight TEXT, activity TEXT, goal TEXT,
+    target_cal TEXT, p_goal TEXT, f_goal TEXT, c_goal TEXT
+);
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    meal_text TEXT,
+    protein NUMERIC, fat NUMERIC, carbs NUMERIC, calories NUMERIC
+);
+CREATE INDEX IF NOT EXISTS idx_meals_user_date ON meals(user_id, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+MEAL_COLUMNS = ", ".join(MEAL_FIELDS)
+USER_COLUMNS = ", ".join(USER_FIELDS)
+
+
+class SQLiteClient:
+    """
+    Хранилище на SQLite с тем же набором методов, что и CSVClient.
+    Позиция приёма пищи (get_last_meal / delete_meal) — его id в таблице meals.
+    """
+
+    def __init__(self, db_file=SQLITE_FILE, users_file=USERS_FILE, meals_file=MEALS_FILE):
+        self.db_file = db_file
+        # одно соединение на процесс; запись сериализуется блокировкой
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+        self.migrate_from_csv(users_file, meals_file)
+
+    def _fetchall(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция на запись под блокировкой; при исключении — ROLLBACK, чтобы соединение не осталось в транзакции."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # --- Миграция ---
+    def migrate_from_csv(self, users_file=USERS_FILE, meals_file=MEALS_FILE) -> bool:
+        """Однократно переносит data/users.csv и data/meals.csv в базу. Возвращает True, если перенос был."""
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_csv'").fetchone():
+                return False
+
+            users, meals = [], []
+            if os.path.exists(users_file):
+                with open(users_file, newline="", encoding="utf-8") as f:
+                    users = [u for u in csv.DictReader(f) if _valid_id(u.get("user_id"))]
+            if os.path.exists(meals_file):
+                with open(meals_file, newline="", encoding="utf-8") as f:
+                    records = list(csv.DictReader(f))
+                # журнал CSVClient: пропускаем надгробия и удалённые ими приёмы
+                dead = {r.get("meal_id") for r in records if r.get("deleted") == "1"}
+                meals = [m for m in records
+                         if m.get("deleted") != "1" and (m.get("meal_id") is None or m["meal_id"] not in dead)
+                         and _valid_id(m.get("user_id"))]
+
+            with self._transaction() as conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO users ({USER_COLUMNS}) VALUES ({_marks(USER_FIELDS)})",
+                    [[u.get(k, "") for k in USER_FIELDS] for u in users],
+                )
+                conn.executemany(
+                    f"INSERT INTO meals ({MEAL_COLUMNS}) VALUES ({_marks(MEAL_FIELDS)})",
+                    [_meal_values(m) for m in meals],
+                )
+                conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_csv', ?)",
+                             (f"{len(users)} users, {len(meals)} meals",))
+            return True
+
+    # --- Пользователи ---
+    def get_users(self):
+        rows = self._fetchall(f"SELECT {USER_COLUMNS} FROM users")
+        return [_user_dict(r) for r in rows]
+
+    def user_exists(self, user_id):
+        return self._fetchone("SELECT 1 FROM users WHERE user_id = ?", (int(user_id),)) is not None
+
+    def add_user(self, user_data):
+        values = list(user_data) + [""] * (len(USER_FIELDS) - len(user_data))
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO users ({USER_COLUMNS}) VALUES ({_marks(USER_FIELDS)})",
+                [int(values[0]), *("" if v is None else str(v) for v in values[1:len(USER_FIELDS)])],
+            )
+
+    def get_user(self, user_id):
+        row = self._fetchone(f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?", (int(user_id),))
+        return _user_dict(row) if row else None
+
+    def update_user_target(self, user_id: int, new_goal: dict):
+        """Обновляет цель пользователя (new_goal — dict с ключами goal/target_cal/p_goal/f_goal/c_goal)."""
+        keys = [k for k in ("goal", "target_cal", "p_goal", "f_goal", "c_goal") if k in new_goal]
+        if not keys:
+            return
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE users SET {', '.join(f'{k} = ?' for k in keys)} WHERE user_id = ?",
+                [str(new_goal[k]) for k in keys] + [int(user_id)],
+            )
+
+    def save_users(self, users):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM users")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO users ({USER_COLUMNS}) VALUES ({_marks(USER_FIELDS)})",
+                [[u.get(k, "") for k in USER_FIELDS] for u in users if _valid_id(u.get("user_id"))],
+            )
+
+    def get_all_user_ids(self):
+        return [r[0] for r in self._fetchall("SELECT user_id FROM users")]
+
+    def delete_user(self, user_id):
+        """Удаляет профиль пользователя и все его приёмы пищи."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM users WHERE user_id = ?", (int(user_id),))
+            conn.execute("DELETE FROM meals WHERE user_id = ?", (int(user_id),))
+
+    # --- Приёмы пищи ---
+    def get_meals(self):
+        """Все приёмы по порядку; meal_id (строка, как в CSVClient) — id в таблице meals."""
+        rows = self._fetchall(f"SELECT id, {MEAL_COLUMNS} FROM meals ORDER BY id")
+        return [{**_meal_dict(r), "meal_id": str(r["id"])} for r in rows]
+
+    def add_meal(self, meal_data) -> int:
+        """Добавляет приём, возвращает его id."""
+        return self.add_meals([meal_data])[0]
+
+    def add_meals(self, meals_data: list) -> list[int]:
+        """Добавляет несколько приёмов одной транзакцией (group commit), возвращает их id."""
+        with self._transaction() as conn:
+            return [
+                conn.execute(f"INSERT INTO meals ({MEAL_COLUMNS}) VALUES ({_marks(MEAL_FIELDS)})",
+                             _meal_values(dict(zip(MEAL_FIELDS, meal_data)))).lastrowid
+                for meal_data in meals_data
+            ]
+
+    def save_meals(self, meals: list[dict]):
+        """Полностью заменяет таблицу meals списком словарей (поля как в MEAL_FIELDS, meal_id сохраняется)."""
+        meals = [m for m in meals if _valid_id(m.get("user_id"))]
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM meals")
+            conn.executemany(f"INSERT INTO meals (id, {MEAL_COLUMNS}) VALUES (?, {_marks(MEAL_FIELDS)})",
+                             [[int(m["meal_id"]), *_meal_values(m)] for m in meals if _valid_id(m.get("meal_id"))])
+            conn.executemany(f"INSERT INTO meals ({MEAL_COLUMNS}) VALUES ({_marks(MEAL_FIELDS)})",
+                             [_meal_values(m) for m in meals if not _valid_id(m.get("meal_id"))])
+
+    def get_user_meals(self, user_id) -> list[tuple[int, dict]]:
+        """Все приёмы пользователя по порядку: [(id, meal), ...]."""
+        rows = self._fetchall(f"SELECT id, {MEAL_COLUMNS} FROM meals WHERE user_id = ? ORDER BY id",
+                              (int(user_id),))
+        return [(r["id"], _meal_dict(r)) for r in rows]
+
+    def get_last_meal(self, user_id):
+        """Последний приём пользователя: (id, meal) или None."""
+        row = self._fetchone(f"SELECT id, {MEAL_COLUMNS} FROM meals WHERE user_id = ? ORDER BY id DESC LIMIT 1",
+                             (int(user_id),))
+        return (row["id"], _meal_dict(row)) if row else None
+
+    def get_meals_for_day(self, user_id, for_date=None) -> list[dict]:
+        if for_date is None:
+            for_date = date.today().isoformat()
+        rows = self._fetchall(f"SELECT {MEAL_COLUMNS} FROM meals WHERE user_id = ? AND date = ? ORDER BY id",
+                              (int(user_id), for_date))
+        return [_meal_dict(r) for r in rows]
+
+    def delete_meal(self, user_id, meal_id: int):
+        """Удаляет приём по id, если он принадлежит пользователю. Возвращает удалённую запись или None."""
+        with self.lock:
+            row = self.conn.execute(f"SELECT {MEAL_COLUMNS} FROM meals WHERE id = ? AND user_id = ?",
+                                    (int(meal_id), int(user_id))).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("DELETE FROM meals WHERE id = ?", (int(meal_id),))
+            return _meal_dict(row)
+
+    # --- Итоги ---
+    def get_daily_totals(self, user_id, for_date=None):
+        """Суммарное БЖУ и калории за день (числа float)."""
+        if for_date is None:
+            for_date = date.today().isoformat()
+        row = self._fetchone(
+            "SELECT SUM(calories), SUM(protein), SUM(fat), SUM(carbs) FROM meals WHERE user_id = ? AND date = ?",
+            (int(user_id), for_date),
+        )
+        return {k: safe_float(v) for k, v in zip(MACROS, row)}
+
+    def get_range_totals(self, user_id, start: str, end: str) -> dict:
+        """
+        Суммы калорий/БЖУ за период [start, end] (даты ISO, включительно)
+        и число дней с записями в поле "days" — для расчёта среднего.
+        """
+        row = self._fetchone(
+            """
+            SELECT COUNT(*), SUM(c), SUM(p), SUM(f), SUM(cb) FROM (
+                SELECT SUM(calories) AS c, SUM(protein) AS p, SUM(fat) AS f, SUM(carbs) AS cb
+                FROM meals WHERE user_id = ? AND date BETWEEN ? AND ?
+                GROUP BY date
+                HAVING c <> 0 OR p <> 0 OR f <> 0 OR cb <> 0
+            )
+            """,
+            (int(user_id), start, end),
+        )
+        result = {k: safe_float(v) for k, v in zip(MACROS, row[1:])}
+        result["days"] = row[0]
+        return result
+
+
+# --- Helpers ---
+def _marks(fields) -> str:
+    return ", ".join("?" for _ in fields)
+
+
+def _valid_id(value) -> bool:
+    try:
+        int(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _meal_values(meal: dict) -> list:
+    return [
+        int(meal["user_id"]),
+        meal.get("date") or "",
+        meal.get("meal_text") or "",
+        *(safe_float(meal.get(k)) for k in ("protein", "fat", "carbs", "calories")),
+    ]
+
+
+def _meal_dict(row) -> dict:
+    """Приём в формате CSVClient (все значения — строки)."""
+    return {k: "" if row[k] is None else str(row[k]) for k in MEAL_FIELDS}
+
+
+def _user_dict(row) -> dict:
+    """Профиль в формате CSVClient.get_user (все значения — строки)."""
+    return {k: "" if row[k] is None else str(row[k]) for k in USER_FIELDS}
+
+
+if __name__ == "__main__":
+    # Однократный перенос CSV в SQLite: python -m app.services.sqlite_client
+    client = SQLiteClient()
+    print(f"✅ База: {client.db_file}, пользователей: {len(client.get_all_user_ids())}")
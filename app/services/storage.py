@@ -0,0 +1,214 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app.config import STORAGE_BACKEND, SQLITE_PATH, MEAL_SHARDS_DIR
+from app.services.csv_client import CSVClient
+from app.services.logger import logger
+
+# Как часто проверять, не пора ли сжать журнал приёмов (секунды)
+COMPACT_INTERVAL = 600
+# Потоки для чтения и максимальный размер группы записей за один коммит
+READ_THREADS = 4
+MAX_WRITE_BATCH = 256
+
+
+_storage = None
+_async_storage = None
+
+
+def create_storage():
+    """Создаёт клиент хранилища по настройке STORAGE_BACKEND (csv | sharded | sqlite)."""
+    if STORAGE_BACKEND == "sqlite":
+        from app.services.sqlite_client import SQLiteClient
+        return SQLiteClient(SQLITE_PATH)
+    if STORAGE_BACKEND == "sharded":
+        from app.services.sharded_client import ShardedCSVClient
+        return ShardedCSVClient(MEAL_SHARDS_DIR)
+    return CSVClient()
+
+
+def get_storage():
+    """Общий для всего процесса экземпляр хранилища (создаётся при первом обращении)."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+class AsyncStorage:
+    """
+    Асинхронный фасад над синхронным хранилищем (CSVClient / SQLiteClient).
+
+    Чтения выполняются в ограниченном пуле потоков и не блокируют цикл событий.
+    Записи ставятся в очередь и применяются одной задачей-писателем строго по порядку:
+    всё, что накопилось в очереди, пока шёл предыдущий коммит, уходит одной группой —
+    подряд идущие add_meal превращаются в один add_meals (один write + fsync).
+    Подписчики (listeners) получают on_committed([(method, args, result), ...])
+    в потоке писателя сразу после каждой группы — так работает журнал репликации.
+    """
+
+    def __init__(self, storage, read_threads=READ_THREADS, max_batch=MAX_WRITE_BATCH):
+        self.sync = storage
+        self.max_batch = max_batch
+        self._readers = ThreadPoolExecutor(read_threads, thread_name_prefix="storage-read")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="storage-write")
+        self._queue: asyncio.Queue | None = None
+        self._writer_task: asyncio.Task | None = None
+        self.listeners = []
+
+    # --- Чтение ---
+    async def _read(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, partial(getattr(self.sync, method), *args))
+
+    async def get_users(self):
+        return await self._read("get_users")
+
+    async def user_exists(self, user_id):
+        return await self._read("user_exists", user_id)
+
+    async def get_user(self, user_id):
+        return await self._read("get_user", user_id)
+
+    async def get_all_user_ids(self):
+        return await self._read("get_all_user_ids")
+
+    async def get_meals(self):
+        return await self._read("get_meals")
+
+    async def get_user_meals(self, user_id):
+        return await self._read("get_user_meals", user_id)
+
+    async def get_last_meal(self, user_id):
+        return await self._read("get_last_meal", user_id)
+
+    async def get_meals_for_day(self, user_id, for_date=None):
+        return await self._read("get_meals_for_day", user_id, for_date)
+
+    async def get_daily_totals(self, user_id, for_date=None):
+        return await self._read("get_daily_totals", user_id, for_date)
+
+    async def get_range_totals(self, user_id, start: str, end: str):
+        return await self._read("get_range_totals", user_id, start, end)
+
+    # --- Запись ---
+    async def _write(self, method: str, *args):
+        if self._writer_task is None or self._writer_task.done():
+            self._queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((method, args, future))
+        return await future
+
+    async def add_user(self, user_data):
+        return await self._write("add_user", user_data)
+
+    async def add_meal(self, meal_data) -> int:
+        return await self._write("add_meal", meal_data)
+
+    async def delete_meal(self, user_id, meal_id: int):
+        return await self._write("delete_meal", user_id, meal_id)
+
+    async def delete_user(self, user_id):
+        return await self._write("delete_user", user_id)
+
+    async def update_user_target(self, user_id: int, new_goal: dict):
+        return await self._write("update_user_target", user_id, new_goal)
+
+    async def save_users(self, users):
+        return await self._write("save_users", users)
+
+    async def save_meals(self, meals: list[dict]):
+        return await self._write("save_meals", meals)
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            op = await self._queue.get()
+            if op is None:
+                return
+            batch = [op]
+            stop = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                op = self._queue.get_nowait()
+                if op is None:
+                    stop = True
+                    break
+                batch.append(op)
+
+            results = await loop.run_in_executor(self._writer, self._commit, batch)
+            for (_, _, future), (result, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            if stop:
+                return
+
+    def _commit(self, batch) -> list[tuple]:
+        """Применяет группу записей по порядку (в потоке писателя). Возвращает [(результат, ошибка)]."""
+        results = []
+        i = 0
+        while i < len(batch):
+            method, args, _ = batch[i]
+            if method == "add_meal":
+                # подряд идущие приёмы — одной записью в журнал
+                j = i
+                while j < len(batch) and batch[j][0] == "add_meal":
+                    j += 1
+                meals = [batch[k][1][0] for k in range(i, j)]
+                try:
+                    results.extend((meal_id, None) for meal_id in self.sync.add_meals(meals))
+                except Exception as e:
+                    logger.error(f"❌ [AsyncStorage] Ошибка записи {len(meals)} приёмов: {e}")
+                    results.extend((None, e) for _ in meals)
+                i = j
+                continue
+            try:
+                results.append((getattr(self.sync, method)(*args), None))
+            except Exception as e:
+                logger.error(f"❌ [AsyncStorage] Ошибка {method}: {e}")
+                results.append((None, e))
+            i += 1
+
+        committed = [(method, args, result) for (method, args, _), (result, error) in zip(batch, results)
+                     if error is None]
+        for listener in self.listeners:
+            try:
+                listener.on_committed(committed)
+            except Exception as e:
+                logger.error(f"❌ [AsyncStorage] Ошибка подписчика {type(listener).__name__}: {e}")
+        return results
+
+    async def close(self):
+        """Дожидается записи всей очереди и останавливает потоки."""
+        if self._writer_task is not None and not self._writer_task.done():
+            self._queue.put_nowait(None)
+            await self._writer_task
+        self._readers.shutdown(wait=False)
+        self._writer.shutdown(wait=True)
+
+
+def get_async_storage() -> AsyncStorage:
+    """Общий асинхронный фасад над get_storage() — его используют хендлеры."""
+    global _async_storage
+    if _async_storage is None:
+        _async_storage = AsyncStorage(get_storage())
+    return _async_storage
+
+
+async def run_meal_compactor(storage, interval=COMPACT_INTERVAL):
+    """Фоновое сжатие журнала приёмов (только для хранилищ с compact_meals)."""
+    compact = getattr(storage, "compact_meals", None)
+    if compact is None:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await asyncio.to_thread(compact):
+                logger.info("🧹 Журнал приёмов пищи сжат")
+        except Exception as e:
+            logger.error(f"❌ [run_meal_compactor] Ошибка сжатия журнала: {e}")
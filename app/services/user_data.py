@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
-from app.services.csv_client import CSVClient, safe_float
+from app.services.csv_client import safe_float
+from app.services.nutrition_utils import normalize_fields, calculate_targets, GOAL_ADJUSTMENT
+from app.services.storage import get_async_storage
 
-csv_client = CSVClient()
+storage = get_async_storage()
 
-def get_user_target(user_id: int) -> dict:
+async def get_user_target(user_id: int) -> dict:
     """Возвращает текущую цель пользователя в числовых типах."""
-    user = csv_client.get_user(user_id)
+    user = await storage.get_user(user_id)
     if not user:
         return {
             "goal": "не указано",
@@ -22,7 +24,20 @@ def get_user_target(user_id: int) -> dict:
         "c_goal": safe_float(user.get("c_goal", 0)),
     }
 
-def get_4weeks_stats(user_id: int) -> dict:
+async def get_formula_targets(user_id: int) -> dict:
+    """
+    Норма по Mifflin–St Jeor для сохранённого профиля: {цель: {target_cal, p_goal, f_goal, c_goal}}
+    для каждой цели. Пустой dict, если профиль неполный.
+    """
+    user = await storage.get_user(user_id)
+    if not user:
+        return {}
+    fields = normalize_fields(user)
+    if any(fields[k] is None for k in ("age", "sex", "height", "weight", "activity")):
+        return {}
+    return {goal: calculate_targets(**{**fields, "goal": goal}) for goal in GOAL_ADJUSTMENT}
+
+async def get_4weeks_stats(user_id: int) -> dict:
     """
     Возвращает структуру:
     {
@@ -36,7 +51,7 @@ def get_4weeks_stats(user_id: int) -> dict:
 
     for i in range(28):
         day = since + timedelta(days=i)
-        day_total = csv_client.get_daily_totals(user_id, day.isoformat())
+        day_total = await storage.get_daily_totals(user_id, day.isoformat())
         # include day only if not all zeros
         if any(safe_float(day_total.get(k, 0)) > 0 for k in ("calories", "protein", "fat", "carbs")):
             day_totals.append({"date": day, **day_total})
@@ -59,9 +74,9 @@ def get_4weeks_stats(user_id: int) -> dict:
 
     return {"days": day_totals, "avg": avg}
 
-def get_4weeks_stats_text(user_id: int) -> str:
+async def get_4weeks_stats_text(user_id: int) -> str:
     """Удобный текст для prompt / log — использует get_4weeks_stats."""
-    stats = get_4weeks_stats(user_id)
+    stats = await get_4weeks_stats(user_id)
     if not stats["days"]:
         return "Нет данных за последние 4 недели."
     a = stats["avg"]
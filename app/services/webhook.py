@@ -0,0 +1,77 @@
+import asyncio
+import signal
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from app.config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
+from app.services.logger import logger
+from app.services.openai_client import breaker
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """
+    aiohttp-приложение для режима webhook:
+    POST WEBHOOK_PATH — апдейты Telegram. Заголовок X-Telegram-Bot-Api-Secret-Token сверяется
+    с WEBHOOK_SECRET (иначе 401), ответ 200 отдаётся сразу, обработка — в фоновой задаче.
+    GET /health — проверка живости для балансировщика / docker healthcheck.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+
+    started_at = time.monotonic()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok",
+            "uptime_s": round(time.monotonic() - started_at),
+            "llm_breaker": breaker.state,
+        })
+
+    app.router.add_get("/health", health)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """
+    Поднимает HTTP-сервер на WEBAPP_HOST:WEBAPP_PORT и регистрирует webhook в Telegram.
+    Без WEBHOOK_BASE_URL webhook не регистрируется — удобно для локальной проверки:
+    апдейты можно слать POST-запросом вручную (make webhook-replay).
+    """
+    runner = web.AppRunner(create_webhook_app(dp, bot))
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    logger.info(f"🌐 [webhook] Слушаю http://{WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+    if WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"🌐 [webhook] Webhook зарегистрирован: {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+
+    # docker stop / Ctrl+C: выходим штатно, чтобы отработали finally здесь и в main
+    # (сброс FSM, дозапись очереди хранилища, снимок метрик)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await dp.emit_startup(bot=bot)
+        await stop.wait()
+        logger.info("🛑 [webhook] Получен сигнал остановки, завершаю работу")
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await dp.emit_shutdown(bot=bot)
+        await runner.cleanup()
+        await bot.session.close()